@@ -1,6 +1,7 @@
 from typing import Annotated
 
 from app.api.auth.schemas import TokensTuple
+from app.api.auth.services import UserService
 from app.dependencies.responses import okresponse
 from app.utils.cookies import get_tokens_cookies
 from fastapi import APIRouter, Depends, status
@@ -9,7 +10,11 @@ router = APIRouter()
 
 
 @router.post("/logout", status_code=status.HTTP_200_OK)
-async def logout(cookies: Annotated[TokensTuple, Depends(get_tokens_cookies)]):
+async def logout(
+    cookies: Annotated[TokensTuple, Depends(get_tokens_cookies)],
+    service: Annotated[UserService, Depends(UserService)],
+):
+    await service.logout(cookies)
     response = okresponse()
     response.delete_cookie("access_token")
     response.delete_cookie("refresh_token")
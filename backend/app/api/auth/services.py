@@ -1,12 +1,14 @@
+from time import time
 from typing import Annotated
 
 from app.api.auth.schemas import InitData, TokensTuple, UserCreate
 from app.core.settings import settings
 from app.database.models import User
-from app.dependencies.db_dependency import DBDependency
+from app.dependencies.db_dependency import DBDependency, get_db
 from app.dependencies.redis_dependency import RedisDependency
 from app.dependencies.responses import okresponse
 from app.dependencies.telegram import validate_init_data
+from app.utils.token_cache import REVOKED_CHANNEL, token_digest
 from app.utils.token_manager import TokenManager
 from fastapi import Depends
 from fastapi.exceptions import HTTPException
@@ -20,7 +22,7 @@ class UserService:
 
     def __init__(
         self,
-        db: Annotated[DBDependency, Depends(DBDependency)],
+        db: Annotated[DBDependency, Depends(get_db)],
         redis: Annotated[RedisDependency, Depends(RedisDependency)],
     ) -> None:
         self.db = db
@@ -72,3 +74,14 @@ class UserService:
                     user_id,
                 )
             return access_token
+
+    async def logout(self, tokens: TokensTuple):
+        try:
+            expires_at = TokenManager.decode_token(tokens.access_token)["exp"]
+        except HTTPException:
+            return
+        digest = token_digest(tokens.access_token)
+        async with self.redis.pipeline() as pipe:
+            pipe.delete(f"access_token:{tokens.access_token}")
+            pipe.setex(f"revoked_token:{digest}", max(int(expires_at - time()), 1), 1)
+            pipe.publish(REVOKED_CHANNEL, digest)
@@ -0,0 +1,18 @@
+from app.core.pubsub.hub import hub
+from app.dependencies.checks import check_internal_token
+from app.dependencies.db_dependency import DBDependency
+from app.dependencies.redis_dependency import RedisDependency
+from app.utils.token_cache import token_cache
+from fastapi import APIRouter, Depends
+
+router = APIRouter()
+
+
+@router.get("/pool-stats", dependencies=[Depends(check_internal_token)])
+async def pool_stats():
+    return {
+        "db": DBDependency.pool_stats(),
+        "redis": RedisDependency.pool_stats(),
+        "sse": hub.stats(),
+        "token_cache": token_cache.stats(),
+    }
@@ -0,0 +1,127 @@
+from datetime import date
+from typing import List, Optional, Sequence, Tuple
+
+from app.core.settings import settings
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+
+# Versions start from the server clock, so a version key lost to eviction or expiry
+# never comes back with a value that older cache entries were written under.
+INIT_VERSION = """
+local version = redis.call('GET', KEYS[1])
+if not version then
+    local now = redis.call('TIME')
+    version = now[1] .. string.format('%06d', now[2])
+    redis.call('SET', KEYS[1], version, 'EX', ARGV[1])
+end
+"""
+
+READ_VERSION_SCRIPT = INIT_VERSION + "return version\n"
+
+# ARGV[4..] are the versions in the client's If-None-Match, a match skips the cached body.
+READ_SCRIPT = (
+    INIT_VERSION
+    + """
+for i = 4, #ARGV do
+    if ARGV[i] == version then
+        return {version, 1}
+    end
+end
+local cached = redis.call('GET', ARGV[2] .. version .. ARGV[3])
+if not cached then
+    return {version, 0}
+end
+return {version, 0, cached}
+"""
+)
+
+BUMP_SCRIPT = (
+    INIT_VERSION
+    + """
+redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+"""
+)
+
+
+def version_key(user_id: int) -> str:
+    return f"messages:version:{user_id}"
+
+
+def profile_version_key(user_id: int) -> str:
+    return f"profile:version:{user_id}"
+
+
+def range_key(user_id: int, version: str, suffix: str) -> str:
+    return f"messages:range:{user_id}:{version}{suffix}"
+
+
+def range_suffix(
+    start_date: date, end_date: Optional[date], limit: Optional[int], cursor: Optional[str]
+) -> str:
+    return f":{start_date.isoformat()}:{end_date or ''}:{limit or ''}:{cursor or ''}"
+
+
+# ETags carry the user id, so a tag kept across an account switch never matches.
+def etag(user_id: int, version: str) -> str:
+    return f'"{user_id}.{version}"'
+
+
+def tag_versions(if_none_match: Optional[str], user_id: int) -> List[str]:
+    if not if_none_match:
+        return []
+    prefix = f'"{user_id}.'
+    versions = []
+    for tag in if_none_match.split(","):
+        tag = tag.strip().removeprefix("W/")
+        if tag.startswith(prefix) and tag.endswith('"'):
+            versions.append(tag[len(prefix) : -1])
+    return versions
+
+
+async def read_version(client: Redis, key: str) -> str:
+    return await client.register_script(READ_VERSION_SCRIPT)(
+        keys=[key], args=[settings.redis_settings.message_version_ttl]
+    )
+
+
+async def read_range(
+    client: Redis, user_id: int, suffix: str, versions: Sequence[str] = ()
+) -> Tuple[str, bool, Optional[Tuple[str, Optional[str]]]]:
+    version, not_modified, *cached = await client.register_script(READ_SCRIPT)(
+        keys=[version_key(user_id)],
+        args=[
+            settings.redis_settings.message_version_ttl,
+            f"messages:range:{user_id}:",
+            suffix,
+            *versions,
+        ],
+    )
+    if not cached:
+        return version, bool(not_modified), None
+    next_cursor, body = cached[0].split("|", 1)
+    return version, False, (body, next_cursor or None)
+
+
+async def write_range(
+    client: Redis, user_id: int, version: str, suffix: str, body: str, next_cursor: Optional[str]
+) -> None:
+    await client.set(
+        range_key(user_id, version, suffix),
+        f"{next_cursor or ''}|{body}",
+        ex=settings.redis_settings.message_cache_ttl,
+    )
+
+
+async def _bump(pipe: Pipeline, key: str) -> None:
+    await pipe.register_script(BUMP_SCRIPT)(
+        keys=[key], args=[settings.redis_settings.message_version_ttl], client=pipe
+    )
+
+
+async def bump_version(pipe: Pipeline, user_id: int) -> None:
+    await _bump(pipe, version_key(user_id))
+
+
+async def bump_profile_version(pipe: Pipeline, user_id: int) -> None:
+    await _bump(pipe, profile_version_key(user_id))
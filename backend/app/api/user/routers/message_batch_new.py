@@ -0,0 +1,17 @@
+from typing import Annotated
+
+from app.api.user.schemas import CreatedMessagesResponse, MessageBatchCreateScheme
+from app.api.user.services import MessageService
+from app.dependencies.checks import check_user_token
+from fastapi import APIRouter, Depends
+
+router = APIRouter()
+
+
+@router.post("/message-batch", response_model=CreatedMessagesResponse)
+async def create_messages(
+    batch: MessageBatchCreateScheme,
+    user_id: Annotated[int, Depends(check_user_token)],
+    service: Annotated[MessageService, Depends(MessageService)],
+):
+    return await service.create_messages(batch, user_id)
@@ -0,0 +1,17 @@
+from typing import Annotated
+
+from app.api.user.schemas import MessageBatchUpdateScheme
+from app.api.user.services import MessageService
+from app.dependencies.checks import check_user_token
+from fastapi import APIRouter, Depends
+
+router = APIRouter()
+
+
+@router.patch("/message-batch")
+async def update_messages(
+    batch: MessageBatchUpdateScheme,
+    user_id: Annotated[int, Depends(check_user_token)],
+    service: Annotated[MessageService, Depends(MessageService)],
+):
+    return await service.update_messages(batch, user_id)
@@ -1,10 +1,10 @@
-from typing import Annotated
+from typing import Annotated, Optional
 from uuid import UUID
 
 from app.api.user.schemas import MessageScheme
 from app.api.user.services import MessageService
 from app.dependencies.checks import check_user_token
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header
 
 router = APIRouter()
 
@@ -14,5 +14,6 @@ async def list_message(
     user_id: Annotated[int, Depends(check_user_token)],
     service: Annotated[MessageService, Depends(MessageService)],
     msg_id: UUID,
+    if_none_match: Optional[str] = Header(None),
 ):
-    return await service.get_message(user_id, msg_id)
+    return await service.get_message(user_id, msg_id, projected=True, if_none_match=if_none_match)
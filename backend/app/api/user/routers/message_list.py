@@ -4,7 +4,8 @@ from typing import Annotated, List, Optional
 from app.api.user.schemas import MessageScheme
 from app.api.user.services import MessageService
 from app.dependencies.checks import check_user_token
-from fastapi import APIRouter, Depends, Query
+from app.dependencies.responses import etagresponse, notmodifiedresponse
+from fastapi import APIRouter, Depends, Header, Query
 
 router = APIRouter()
 
@@ -15,5 +16,14 @@ async def list_message(
     service: Annotated[MessageService, Depends(MessageService)],
     start_date: date = Query(...),
     end_date: Optional[date] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = Query(None),
+    if_none_match: Optional[str] = Header(None),
 ):
-    return await service.list_messages(user_id, start_date, end_date)
+    tag, body, next_cursor = await service.list_messages(
+        user_id, start_date, end_date, limit, cursor, projected=True, if_none_match=if_none_match
+    )
+    if body is None:
+        return notmodifiedresponse(tag)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return etagresponse(body, tag, headers)
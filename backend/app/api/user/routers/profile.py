@@ -1,9 +1,9 @@
-from typing import Annotated
+from typing import Annotated, Optional
 
 from app.api.user.schemas import UserProfileResponse
 from app.api.user.services import MessageService
 from app.dependencies.checks import check_user_token
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header
 
 router = APIRouter()
 
@@ -12,5 +12,6 @@ router = APIRouter()
 async def profile(
     user_id: Annotated[int, Depends(check_user_token)],
     service: Annotated[MessageService, Depends(MessageService)],
+    if_none_match: Optional[str] = Header(None),
 ):
-    return await service.profile(user_id)
+    return await service.profile(user_id, if_none_match)
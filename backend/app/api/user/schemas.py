@@ -1,9 +1,10 @@
 from datetime import date, time
-from typing import Optional
+from typing import Annotated, List, Literal, Optional
 from uuid import UUID
 
 from app.database.utils import MsgType
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field, field_serializer
+from typing_extensions import TypedDict
 
 
 class UserProfileResponse(BaseModel):
@@ -15,6 +16,22 @@ class UserProfileResponse(BaseModel):
     model_config = ConfigDict(arbitrary_types_allowed=True)
 
 
+class RepeatRule(BaseModel):
+    freq: Literal["daily", "weekly", "monthly"] = "weekly"
+    interval: int = Field(1, ge=1)
+    until: Optional[date] = None
+    monthday: Optional[int] = Field(None, ge=1, le=31)
+
+    @field_serializer("until")
+    def serialize_until(self, until: Optional[date]):
+        return until.isoformat() if until else None
+
+
+WeekdayMask = Optional[List[Annotated[int, Field(ge=0, le=6)]]]
+
+MESSAGE_BATCH_LIMIT = 500
+
+
 class MessageCreateScheme(BaseModel):
     event: str = None
     id: Optional[UUID] = None
@@ -33,13 +50,18 @@ class MessageCreateScheme(BaseModel):
     priority: int
     notification: bool = True
     repeat: Optional[bool] = None
-    repeat_wd: Optional[list] = None
+    repeat_wd: WeekdayMask = None
+    repeat_rule: Optional[RepeatRule] = None
 
 
 class CreatedMessageResponse(BaseModel):
     id: UUID
 
 
+class CreatedMessagesResponse(BaseModel):
+    ids: List[UUID]
+
+
 class MessageScheme(BaseModel):
     id: Optional[UUID] = None
     user_id: Optional[int] = None
@@ -53,11 +75,31 @@ class MessageScheme(BaseModel):
     priority: int
     notification: bool = True
     repeat: bool = False
-    repeat_wd: Optional[list] = None
+    repeat_wd: WeekdayMask = None
+    repeat_rule: Optional[RepeatRule] = None
 
     model_config = {"from_attributes": True}
 
 
+# The MessageScheme columns as they come out of a projected query. Rows are only
+# serialized with it, never validated.
+class MessageRow(TypedDict):
+    id: UUID
+    user_id: int
+    name: Optional[str]
+    payload: Optional[dict]
+    start_send_date: date
+    type: MsgType
+    start_send_time: Optional[time]
+    end_send_date: Optional[date]
+    end_send_time: Optional[time]
+    priority: int
+    notification: bool
+    repeat: bool
+    repeat_wd: Optional[List[int]]
+    repeat_rule: Optional[dict]
+
+
 class MessageUpdateScheme(BaseModel):
     event: str = None
     id: Optional[UUID] = None
@@ -76,4 +118,21 @@ class MessageUpdateScheme(BaseModel):
     priority: Optional[int] = None
     notification: bool = True
     repeat: bool = False
-    repeat_wd: Optional[list] = None
+    repeat_wd: WeekdayMask = None
+    repeat_rule: Optional[RepeatRule] = None
+
+
+class MessageBatchCreateScheme(BaseModel):
+    items: List[MessageCreateScheme] = Field(min_length=1, max_length=MESSAGE_BATCH_LIMIT)
+
+
+class MessageBatchUpdateItem(MessageUpdateScheme):
+    id: UUID
+
+
+class MessageBatchUpdateScheme(BaseModel):
+    items: List[MessageBatchUpdateItem] = Field(min_length=1, max_length=MESSAGE_BATCH_LIMIT)
+
+
+class MessageBatchDeleteScheme(BaseModel):
+    ids: List[UUID] = Field(min_length=1, max_length=MESSAGE_BATCH_LIMIT)
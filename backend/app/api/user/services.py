@@ -1,223 +1,648 @@
-import json
 from datetime import date, datetime, timezone
-from typing import Annotated, Optional
+from typing import Annotated, List, Optional, Tuple
 from uuid import UUID, uuid4
 
+from app.api.user.cache import (
+    bump_profile_version,
+    etag,
+    profile_version_key,
+    range_suffix,
+    read_range,
+    read_version,
+    tag_versions,
+    version_key,
+    write_range,
+)
 from app.api.user.schemas import (
     CreatedMessageResponse,
+    CreatedMessagesResponse,
+    MessageBatchCreateScheme,
+    MessageBatchDeleteScheme,
+    MessageBatchUpdateScheme,
     MessageCreateScheme,
+    MessageRow,
     MessageScheme,
     MessageUpdateScheme,
+    RepeatRule,
     UserProfileResponse,
 )
-from app.core.taskiq.broker import source
-from app.core.taskiq.tasks import send_telegram
-from app.database.models import Message, User
-from app.dependencies.db_dependency import DBDependency
+from app.api.user.utils import decode_cursor, encode_cursor
+from app.core.outbox.relay import relay
+from app.core.taskiq.scheduling import fire_datetime, horizon_end, planned_schedule_id
+from app.database.models import Message, Outbox, User
+from app.database.utils import fire_at_expression
+from app.dependencies.db_dependency import DBDependency, get_db
 from app.dependencies.redis_dependency import RedisDependency
-from app.dependencies.responses import emptyresponse, okresponse
+from app.dependencies.responses import (
+    emptyresponse,
+    etagresponse,
+    notmodifiedresponse,
+    okresponse,
+)
+from app.utils.recurrence import first_occurrence
+from app.utils.serialization import dumps_models, dumps_str
 from fastapi import Depends
 from fastapi.exceptions import HTTPException
-from sqlalchemy import and_, or_, update
+from pydantic import TypeAdapter
+from sqlalchemy import (
+    BigInteger,
+    Date,
+    Text,
+    Time,
+    Uuid,
+    and_,
+    case,
+    delete,
+    func,
+    insert,
+    literal,
+    literal_column,
+    null,
+    true,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import JSONB, array
 from sqlalchemy.future import select
 
+message_list_adapter = TypeAdapter(List[MessageScheme])
+# Projected reads select exactly the MessageScheme columns, so their rows are dumped as they
+# are, without ORM hydration or model validation.
+message_row_adapter = TypeAdapter(MessageRow)
+message_rows_adapter = TypeAdapter(List[MessageRow])
+# Ownership and scheduling state are kept by the service. Request bodies may carry these
+# fields, but their values are never written or echoed back in events.
+SERVER_FIELDS = frozenset(
+    {"id", "user_id", "send_start", "send_end", "start_schedule_id", "end_schedule_id"}
+)
+VALUES_EXCLUDE = SERVER_FIELDS | {"event"}
+START_FIELDS = frozenset(
+    {"start_send_date", "start_send_time", "repeat", "repeat_wd", "repeat_rule"}
+)
+
 
 class MessageService:
     user = User
     message = Message
+    message_columns = [getattr(Message, field) for field in MessageRow.__annotations__]
 
     def __init__(
         self,
-        db: Annotated[DBDependency, Depends(DBDependency)],
+        db: Annotated[DBDependency, Depends(get_db)],
         redis: Annotated[RedisDependency, Depends(RedisDependency)],
     ):
         self.db = db
         self.redis = redis
 
+    @staticmethod
+    def _prepare_new(message: MessageCreateScheme, user_id: int) -> dict:
+        # Fire times are scheduling state, computed here and written with the row only. The
+        # other server fields are reset, whatever the request carried for them.
+        message.user_id = user_id
+        message.id = uuid4()
+        message.send_start = True
+        message.send_end = None
+        message.start_schedule_id = message.end_schedule_id = None
+        MessageService._normalize_start(message)
+        fire_ats = {
+            "start_fire_at": fire_datetime(message.start_send_date, message.start_send_time)
+        }
+        if message.end_send_date:
+            fire_ats["end_fire_at"] = fire_datetime(message.end_send_date, message.end_send_time)
+            message.send_end = True
+        return fire_ats
+
+    @staticmethod
+    def _normalize_start(message, current: Optional[Message] = None) -> None:
+        # Monthly rules keep the day they started on, and a weekly start on an excluded weekday
+        # moves to the first allowed one. On update, fields the request leaves out come from the
+        # current row; a moved start is written back to the request so it is stored and echoed.
+        def pick(field):
+            if current is None or field in message.model_fields_set:
+                return getattr(message, field)
+            return getattr(current, field)
+
+        if not pick("repeat"):
+            return
+        start_send_date = pick("start_send_date")
+        rule = pick("repeat_rule")
+        if isinstance(rule, RepeatRule):
+            if rule.freq == "monthly":
+                rule.monthday = rule.monthday or start_send_date.day
+            rule = rule.model_dump()
+        start = fire_datetime(start_send_date, pick("start_send_time"))
+        first = first_occurrence(start, pick("repeat_wd"), rule)
+        if current is None or first != start:
+            message.start_send_date = first.date()
+
+    @staticmethod
+    def _update_values(message_upd: MessageUpdateScheme, message: Message) -> dict:
+        values = message_upd.model_dump(
+            exclude_none=True, exclude_unset=True, exclude=VALUES_EXCLUDE
+        )
+        values["id"] = message.id
+        if message_upd.start_send_date or message_upd.start_send_time:
+            values["start_fire_at"] = fire_datetime(
+                message_upd.start_send_date or message.start_send_date,
+                message_upd.start_send_time or message.start_send_time,
+            )
+            values["send_start"] = True
+        if message_upd.end_send_date or message_upd.end_send_time:
+            values["end_fire_at"] = fire_datetime(
+                message_upd.end_send_date or message.end_send_date,
+                message_upd.end_send_time or message.end_send_time,
+            )
+            values["send_end"] = True
+        values["updated_at"] = datetime.now(timezone.utc)
+        return values
+
+    @staticmethod
+    def _fire(
+        msg_id: UUID, kind: str, old_id: Optional[UUID], new_id: Optional[UUID]
+    ) -> List[Optional[str]]:
+        return [str(msg_id), kind, old_id and str(old_id), new_id and str(new_id)]
+
+    def _new_fires(self, message: MessageCreateScheme, fire_ats: dict) -> list:
+        horizon = horizon_end()
+        fires = []
+        for kind in ("start", "end"):
+            schedule_id = planned_schedule_id(fire_ats.get(f"{kind}_fire_at"), horizon)
+            if schedule_id is not None:
+                setattr(message, f"{kind}_schedule_id", str(schedule_id))
+                fires.append(self._fire(message.id, kind, None, schedule_id))
+        return fires
+
+    def _refresh_fires(self, message: Message, values: dict, horizon: datetime) -> list:
+        # Snapshots carry the rendered text, so every pending fire is re-stamped on update,
+        # not only the ones whose time changed.
+        now = datetime.now(timezone.utc)
+        fires = []
+        for kind in ("start", "end"):
+            fire_at = values.get(f"{kind}_fire_at")
+            schedule_id = getattr(message, f"{kind}_schedule_id")
+            if fire_at is None and schedule_id is not None:
+                if kind == "start" and message.send_start:
+                    fire_at = message.start_fire_at
+                elif kind == "end" and message.end_fire_at and message.end_fire_at > now:
+                    fire_at = message.end_fire_at
+            if fire_at is not None:
+                values[f"{kind}_schedule_id"] = new_id = planned_schedule_id(fire_at, horizon)
+                fires.append(self._fire(message.id, kind, schedule_id, new_id))
+        return fires
+
+    @staticmethod
+    def _fires_column(msg_id, old_ids, new_ids):
+        return func.jsonb_build_array(
+            *(
+                func.jsonb_build_array(msg_id, literal_column(f"'{kind}'"), old_id, new_id)
+                for kind, old_id, new_id in zip(("start", "end"), old_ids, new_ids)
+            )
+        )
+
+    @staticmethod
+    def _outbox_insert(source, user_id, fires, forget, event: str):
+        # One statement: the message change runs as a CTE and the outbox row is only written
+        # when it matched, so RETURNING tells whether the caller owned the message.
+        return (
+            insert(Outbox)
+            .from_select(
+                ["user_id", "fires", "forget", "event", "created_at"],
+                select(user_id, fires, forget, literal(event, Text()), func.now()).select_from(
+                    source
+                ),
+            )
+            .returning(Outbox.id)
+        )
+
+    @staticmethod
+    def _fill_missing(rows: List[dict], fallback) -> List[dict]:
+        # Bulk statements are compiled once per column set, so every row gets the same keys.
+        keys = set().union(*rows)
+        for row in rows:
+            for key in keys - row.keys():
+                row[key] = fallback(row, key)
+        return rows
+
+    def _column_default(self, row: dict, key: str):
+        default = self.message.__table__.c[key].default
+        return default.arg if default is not None and default.is_scalar else None
+
     async def create_message(self, message: MessageCreateScheme, user_id: int):
+        fire_ats = self._prepare_new(message, user_id)
+        fires = self._new_fires(message, fire_ats)
+        message_dict = {
+            **message.model_dump(exclude_none=True, exclude_unset=True, exclude={"event"}),
+            **fire_ats,
+        }
+        message_dict["updated_at"] = datetime.now(timezone.utc)
+        table = self.message.__table__
+        user_exists = select(self.user.id).where(self.user.id == user_id).exists()
+        inserted = (
+            insert(table)
+            .from_select(
+                list(message_dict),
+                select(
+                    *(literal(value, table.c[key].type) for key, value in message_dict.items())
+                ).where(user_exists),
+            )
+            .returning(table.c.id)
+            .cte("inserted")
+        )
+        message.event = "message_created"
         async with self.db.db_session() as session:
-            user = await session.execute(select(self.user).where(self.user.id == user_id))
-            if user.scalar_one_or_none():
-                message.user_id = user_id
-                message.id = uuid4()
-                start_send_datetime = datetime.combine(
-                    message.start_send_date, message.start_send_time, timezone.utc
-                )
-                schedule1 = await send_telegram.schedule_by_time(
-                    source, start_send_datetime, message.id, user_id
+            result = await session.execute(
+                self._outbox_insert(
+                    inserted,
+                    literal(user_id, BigInteger()),
+                    literal(fires, JSONB()),
+                    null(),
+                    message.model_dump_json(
+                        exclude_none=True, exclude_unset=True, exclude=SERVER_FIELDS - {"id"}
+                    ),
                 )
-                message.start_schedule_id = schedule1.schedule_id
-                if message.end_send_date:
-                    end_send_datetime = message.end_send_date
-                    if message.end_send_time:
-                        end_send_datetime = datetime.combine(
-                            message.end_send_date, message.end_send_time, timezone.utc
-                        )
-                    schedule2 = await send_telegram.schedule_by_time(
-                        source, end_send_datetime, message.id, user_id
-                    )
-                    message.end_schedule_id = schedule2.schedule_id
-                    message.send_end = True
-                if message.repeat:
-                    pass
-                message_dict = message.model_dump(exclude_none=True, exclude_unset=True)
-                message.event = "message_created"
-                msg_json = message.model_dump_json(exclude_none=True, exclude_unset=True)
-                record = self.message(**message_dict)
-                session.add(record)
-                await session.commit()
-                await session.refresh(record)
-                async with self.redis.get_client() as client:
-                    await client.publish(f"messages:{user_id}", msg_json)
-                return CreatedMessageResponse(id=message.id)
-            raise HTTPException(404, "User not found")
-
-    async def list_messages(self, user_id: int, start_date: date, end_date: Optional[date] = None):
+            )
+            if result.scalar_one_or_none() is None:
+                raise HTTPException(404, "User not found")
+            await session.commit()
+        relay.wake()
+        return CreatedMessageResponse(id=message.id)
+
+    async def create_messages(self, batch: MessageBatchCreateScheme, user_id: int):
         async with self.db.db_session() as session:
-            if not end_date:
-                query = (
-                    select(self.message)
-                    .where(self.message.user_id == user_id)
-                    .where(
-                        or_(
-                            self.message.start_send_date == start_date,
-                            self.message.end_send_date == start_date,
-                            and_(
-                                self.message.start_send_date < start_date,
-                                self.message.end_send_date > start_date,
-                            ),
-                        )
-                    )
+            user = await session.execute(select(self.user.id).where(self.user.id == user_id))
+            if user.scalar_one_or_none() is None:
+                raise HTTPException(404, "User not found")
+            messages = batch.items
+            updated_at = datetime.now(timezone.utc)
+            fires = []
+            rows = []
+            for message in messages:
+                fire_ats = self._prepare_new(message, user_id)
+                fires.extend(self._new_fires(message, fire_ats))
+                rows.append(
+                    {
+                        **message.model_dump(
+                            exclude_none=True, exclude_unset=True, exclude={"event"}
+                        ),
+                        **fire_ats,
+                        "updated_at": updated_at,
+                    }
                 )
-            else:
-                query = (
-                    select(self.message)
-                    .where(self.message.user_id == user_id)
-                    .where(
-                        or_(
-                            self.message.start_send_date == start_date,
-                            self.message.start_send_date == end_date,
-                            self.message.end_send_date == start_date,
-                            self.message.end_send_date == end_date,
-                            and_(
-                                self.message.start_send_date < start_date,
-                                self.message.end_send_date > end_date,
-                            ),
-                        )
-                    )
+            rows = self._fill_missing(rows, self._column_default)
+            result = await session.execute(
+                insert(self.message).returning(self.message.id, sort_by_parameter_order=True),
+                rows,
+            )
+            ids = result.scalars().all()
+            await session.execute(
+                insert(Outbox).values(
+                    user_id=user_id,
+                    fires=fires,
+                    event=dumps_models(
+                        {"event": "messages_created", "items": messages},
+                        exclude_none=True,
+                        exclude_unset=True,
+                        exclude={"items": {"__all__": VALUES_EXCLUDE - {"id"}}},
+                    ).decode(),
                 )
+            )
+            await session.commit()
+        relay.wake()
+        return CreatedMessagesResponse(ids=ids)
+
+    @classmethod
+    def list_messages_query(
+        cls,
+        user_id: int,
+        start_date: date,
+        end_date: Optional[date] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        projected: bool = False,
+    ):
+        end_date = end_date or start_date
+        query = select(*cls.message_columns) if projected else select(cls.message)
+        query = query.where(
+            cls.message.user_id == user_id,
+            cls.message.start_send_date <= end_date,
+            func.coalesce(cls.message.end_send_date, cls.message.start_send_date) >= start_date,
+        )
+        if limit is None:
+            return query
+        if cursor:
+            query = query.where(
+                tuple_(cls.message.start_send_date, cls.message.id) > decode_cursor(cursor)
+            )
+        return query.order_by(cls.message.start_send_date, cls.message.id).limit(limit + 1)
+
+    async def list_messages(
+        self,
+        user_id: int,
+        start_date: date,
+        end_date: Optional[date] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        projected: bool = False,
+        if_none_match: Optional[str] = None,
+    ) -> Tuple[str, Optional[str], Optional[str]]:
+        # Returns (etag, body, next_cursor), body is None when the client's copy is current.
+        suffix = range_suffix(start_date, end_date, limit, cursor)
+        async with self.redis.get_client() as client:
+            version, not_modified, cached = await read_range(
+                client, user_id, suffix, tag_versions(if_none_match, user_id)
+            )
+        tag = etag(user_id, version)
+        if not_modified:
+            return tag, None, None
+        if cached is not None:
+            return (tag, *cached)
+        async with self.db.db_session() as session:
+            query = self.list_messages_query(
+                user_id, start_date, end_date, limit, cursor, projected
+            )
             result = await session.execute(query)
-            return result.scalars().all()
+            messages = result.all() if projected else result.scalars().all()
+        next_cursor = None
+        if limit is not None and len(messages) > limit:
+            messages = messages[:limit]
+            next_cursor = encode_cursor(messages[-1].start_send_date, messages[-1].id)
+        if projected:
+            body = message_rows_adapter.dump_json([row._asdict() for row in messages]).decode()
+        else:
+            body = message_list_adapter.dump_json(
+                message_list_adapter.validate_python(messages, from_attributes=True)
+            ).decode()
+        async with self.redis.get_client() as client:
+            await write_range(client, user_id, version, suffix, body, next_cursor)
+        return tag, body, next_cursor
+
+    async def _not_owned(self, session, msg_id: UUID, user_id: int) -> HTTPException:
+        # Only reached when the scoped statement matched nothing, to tell 403 from 404.
+        result = await session.execute(
+            select(
+                select(self.user.id).where(self.user.id == user_id).exists(),
+                select(self.message.user_id).where(self.message.id == msg_id).scalar_subquery(),
+            )
+        )
+        user_exists, owner_id = result.one()
+        if not user_exists:
+            return HTTPException(404, "User not found")
+        if owner_id is None:
+            return HTTPException(404, "Not found")
+        return HTTPException(403)
+
+    async def _current_tag(self, user_id: int, key: str, if_none_match: Optional[str]):
+        async with self.redis.get_client() as client:
+            version = await read_version(client, key)
+        return etag(user_id, version), version in tag_versions(if_none_match, user_id)
 
-    async def get_message(self, user_id: int, msg_id: UUID):
+    async def get_message(
+        self,
+        user_id: int,
+        msg_id: UUID,
+        projected: bool = False,
+        if_none_match: Optional[str] = None,
+    ):
+        # Tagged with the user's messages version, a match is answered without Postgres.
+        tag, not_modified = await self._current_tag(user_id, version_key(user_id), if_none_match)
+        if not_modified:
+            return notmodifiedresponse(tag)
+        scope = (self.message.id == msg_id, self.message.user_id == user_id)
         async with self.db.db_session() as session:
-            user = await session.execute(select(self.user).where(self.user.id == user_id))
-            if user.scalar_one_or_none():
-                message = await session.execute(
-                    select(self.message).where(self.message.id == msg_id)
-                )
-                message = message.scalar_one_or_none()
-                if message:
-                    if message.user_id == user_id:
-                        return MessageScheme.model_validate(message, from_attributes=True)
-                    else:
-                        raise HTTPException(403)
-                raise HTTPException(404, "Not found")
-            raise HTTPException(404, "User not found")
+            if projected:
+                result = await session.execute(select(*self.message_columns).where(*scope))
+                message = result.one_or_none()
+            else:
+                result = await session.execute(select(self.message).where(*scope))
+                message = result.scalar_one_or_none()
+            if message is None:
+                raise await self._not_owned(session, msg_id, user_id)
+        if projected:
+            return etagresponse(message_row_adapter.dump_json(message._asdict()), tag)
+        return etagresponse(
+            MessageScheme.model_validate(message, from_attributes=True).model_dump_json(), tag
+        )
 
     async def delete_message(self, msg_id: UUID, user_id: int):
+        table = self.message.__table__
+        deleted = (
+            delete(table)
+            .where(table.c.id == msg_id, table.c.user_id == user_id)
+            .returning(
+                table.c.id, table.c.user_id, table.c.start_schedule_id, table.c.end_schedule_id
+            )
+            .cte("deleted")
+        )
         async with self.db.db_session() as session:
-            user = await session.execute(select(self.user).where(self.user.id == user_id))
-            if user.scalar_one_or_none:
-                message = await session.execute(
-                    select(self.message).where(self.message.id == msg_id)
+            result = await session.execute(
+                self._outbox_insert(
+                    deleted,
+                    deleted.c.user_id,
+                    self._fires_column(
+                        deleted.c.id,
+                        (deleted.c.start_schedule_id, deleted.c.end_schedule_id),
+                        (null(), null()),
+                    ),
+                    array([deleted.c.id]),
+                    dumps_str({"event": "message_deleted", "id": msg_id}),
                 )
-                message = message.scalar_one_or_none()
-                if message:
-                    if message.user_id == user_id:
-                        await source.delete_schedule(message.start_schedule_id)
-                        if message.end_schedule_id:
-                            await source.delete_schedule(message.end_schedule_id)
-                        await session.delete(message)
-                        await session.commit()
-                        async with self.redis.get_client() as client:
-                            await client.publish(
-                                f"messages:{user_id}",
-                                json.dumps({"event": "message_deleted", "id": str(msg_id)}),
-                            )
-                        return emptyresponse()
-                    raise HTTPException(403)
-                raise HTTPException(404, "Not found")
-            raise HTTPException(404, "User not found")
+            )
+            if result.scalar_one_or_none() is None:
+                raise await self._not_owned(session, msg_id, user_id)
+            await session.commit()
+        relay.wake()
+        return emptyresponse()
+
+    @staticmethod
+    def _fire_at_column(send_date_column, send_time_column, send_date, send_time):
+        send_date = literal(send_date, Date()) if send_date else send_date_column
+        send_time = literal(send_time, Time(timezone=True)) if send_time else send_time_column
+        return fire_at_expression(send_date, send_time)
+
+    def _update_statement(self, message_upd: MessageUpdateScheme, msg_id: UUID, user_id: int):
+        # Fire times and schedule ids are computed in the statement from the current row, and
+        # the old schedule ids come back through a self-join, so nothing is read beforehand.
+        table = self.message.__table__
+        old = table.alias("old")
+        now = datetime.now(timezone.utc)
+        horizon = horizon_end()
+        values = message_upd.model_dump(
+            exclude_none=True, exclude_unset=True, exclude=VALUES_EXCLUDE
+        )
+        values["updated_at"] = now
+        for kind in ("start", "end"):
+            send_date = getattr(message_upd, f"{kind}_send_date")
+            send_time = getattr(message_upd, f"{kind}_send_time")
+            schedule_id = table.c[f"{kind}_schedule_id"]
+            if send_date or send_time:
+                fire_at = values[f"{kind}_fire_at"] = self._fire_at_column(
+                    table.c[f"{kind}_send_date"], table.c[f"{kind}_send_time"], send_date, send_time
+                )
+                values[f"send_{kind}"] = True
+                refresh = true()
+            else:
+                # Pending fires are re-stamped as well, their snapshot text may have changed.
+                fire_at = table.c[f"{kind}_fire_at"]
+                pending = table.c.send_start if kind == "start" else fire_at > now
+                refresh = and_(schedule_id.is_not(None), pending)
+            values[f"{kind}_schedule_id"] = case(
+                (and_(refresh, fire_at <= horizon), literal(uuid4(), Uuid())),
+                (refresh, null()),
+                else_=schedule_id,
+            )
+        return (
+            update(table)
+            .where(table.c.id == old.c.id, table.c.id == msg_id, table.c.user_id == user_id)
+            .values(**values)
+            .returning(
+                table.c.id,
+                table.c.user_id,
+                old.c.start_schedule_id.label("old_start_schedule_id"),
+                old.c.end_schedule_id.label("old_end_schedule_id"),
+                table.c.start_schedule_id,
+                table.c.end_schedule_id,
+            )
+        )
 
     async def update_message(self, message_upd: MessageUpdateScheme, msg_id: UUID, user_id: int):
+        message_upd.event = "message_updated"
+        message_upd.id = msg_id
+        if message_upd.model_fields_set & START_FIELDS:
+            return await self._update_locked(message_upd, user_id)
+        updated = self._update_statement(message_upd, msg_id, user_id).cte("updated")
         async with self.db.db_session() as session:
-            user = await session.execute(select(self.user).where(self.user.id == user_id))
-            if user.scalar_one_or_none():
-                message = await session.execute(
-                    select(self.message).where(self.message.id == msg_id)
+            result = await session.execute(
+                self._outbox_insert(
+                    updated,
+                    updated.c.user_id,
+                    self._fires_column(
+                        updated.c.id,
+                        (updated.c.old_start_schedule_id, updated.c.old_end_schedule_id),
+                        (updated.c.start_schedule_id, updated.c.end_schedule_id),
+                    ),
+                    null(),
+                    message_upd.model_dump_json(
+                        exclude_none=True, exclude_unset=True, exclude=SERVER_FIELDS - {"id"}
+                    ),
                 )
-                message = message.scalar_one_or_none()
-                if message:
-                    if message.user_id == user_id:
-                        if message_upd.start_send_date or message_upd.start_send_time:
-                            await source.delete_schedule(message.start_schedule_id)
-                            start_date = (
-                                message_upd.start_send_date
-                                if message_upd.start_send_date
-                                else message.start_send_date
-                            )
-                            start_time = (
-                                message_upd.start_send_time
-                                if message_upd.start_send_time
-                                else message.start_send_time
-                            )
-                            start_datetime = datetime.combine(start_date, start_time, timezone.utc)
-                            schedule1 = await send_telegram.schedule_by_time(
-                                source, start_datetime, msg_id, user_id
-                            )
-                            message_upd.start_schedule_id = schedule1.schedule_id
-                            message_upd.send_start = True
-                        if message_upd.end_send_date or message_upd.end_send_time:
-                            await source.delete_schedule(message.end_schedule_id)
-                            end_date = (
-                                message_upd.end_send_date
-                                if message_upd.end_send_date
-                                else message.end_send_date
-                            )
-                            end_time = (
-                                message_upd.end_send_time
-                                if message_upd.end_send_time
-                                else message.end_send_time
-                            )
-                            end_datetime = datetime.combine(end_date, end_time, timezone.utc)
-                            schedule2 = await send_telegram.schedule_by_time(
-                                source, end_datetime, msg_id, user_id
-                            )
-                            message_upd.end_schedule_id = schedule2.schedule_id
-                            message_upd.send_end = True
-                        await session.execute(
-                            update(self.message)
-                            .where(self.message.id == msg_id)
-                            .values(**message_upd.model_dump(exclude_none=True, exclude_unset=True))
-                        )
-                        await session.commit()
-                        message_upd.event = "message_updated"
-                        async with self.redis.get_client() as client:
-                            await client.publish(
-                                f"messages:{user_id}",
-                                message_upd.model_dump_json(exclude_none=True, exclude_unset=True),
-                            )
-                        return okresponse()
-                    raise HTTPException(403)
+            )
+            if result.scalar_one_or_none() is None:
+                raise await self._not_owned(session, msg_id, user_id)
+            await session.commit()
+        relay.wake()
+        return okresponse()
+
+    async def _update_locked(self, message_upd: MessageUpdateScheme, user_id: int):
+        # Normalising the start needs the recurrence already stored, so these edits read the
+        # row under lock like the batch update instead of going through a single statement.
+        async with self.db.db_session() as session:
+            result = await session.execute(
+                select(self.message)
+                .where(self.message.id == message_upd.id, self.message.user_id == user_id)
+                .with_for_update()
+            )
+            message = result.scalar_one_or_none()
+            if message is None:
+                raise await self._not_owned(session, message_upd.id, user_id)
+            self._normalize_start(message_upd, message)
+            values = self._update_values(message_upd, message)
+            fires = self._refresh_fires(message, values, horizon_end())
+            await session.execute(update(self.message), [values])
+            await session.execute(
+                insert(Outbox).values(
+                    user_id=user_id,
+                    fires=fires,
+                    event=message_upd.model_dump_json(
+                        exclude_none=True, exclude_unset=True, exclude=SERVER_FIELDS - {"id"}
+                    ),
+                )
+            )
+            await session.commit()
+        relay.wake()
+        return okresponse()
+
+    async def update_messages(self, batch: MessageBatchUpdateScheme, user_id: int):
+        ids = [item.id for item in batch.items]
+        if len(set(ids)) != len(ids):
+            raise HTTPException(400, "Duplicate message ids")
+        async with self.db.db_session() as session:
+            result = await session.execute(
+                select(self.message)
+                .where(self.message.id.in_(ids), self.message.user_id == user_id)
+                .with_for_update()
+            )
+            messages = {message.id: message for message in result.scalars()}
+            if len(messages) != len(ids):
                 raise HTTPException(404, "Not found")
-            raise HTTPException(404, "User not found")
+            for item in batch.items:
+                self._normalize_start(item, messages[item.id])
+            rows = [self._update_values(item, messages[item.id]) for item in batch.items]
+            horizon = horizon_end()
+            fires = [
+                fire
+                for row in rows
+                for fire in self._refresh_fires(messages[row["id"]], row, horizon)
+            ]
+            rows = self._fill_missing(rows, lambda row, key: getattr(messages[row["id"]], key))
+            await session.execute(update(self.message), rows)
+            await session.execute(
+                insert(Outbox).values(
+                    user_id=user_id,
+                    fires=fires,
+                    event=dumps_models(
+                        {"event": "messages_updated", "items": batch.items},
+                        exclude_none=True,
+                        exclude_unset=True,
+                        exclude={"items": {"__all__": VALUES_EXCLUDE - {"id"}}},
+                    ).decode(),
+                )
+            )
+            await session.commit()
+        relay.wake()
+        return okresponse()
+
+    async def delete_messages(self, batch: MessageBatchDeleteScheme, user_id: int):
+        ids = set(batch.ids)
+        async with self.db.db_session() as session:
+            result = await session.execute(
+                delete(self.message)
+                .where(self.message.id.in_(ids), self.message.user_id == user_id)
+                .returning(
+                    self.message.id, self.message.start_schedule_id, self.message.end_schedule_id
+                )
+            )
+            rows = result.all()
+            if len(rows) != len(ids):
+                raise HTTPException(404, "Not found")
+            await session.execute(
+                insert(Outbox).values(
+                    user_id=user_id,
+                    fires=[
+                        self._fire(row.id, kind, schedule_id, None)
+                        for row in rows
+                        for kind, schedule_id in zip(("start", "end"), row[1:])
+                        if schedule_id
+                    ],
+                    forget=[row.id for row in rows],
+                    event=dumps_str({"event": "messages_deleted", "ids": [row.id for row in rows]}),
+                )
+            )
+            await session.commit()
+        relay.wake()
+        return emptyresponse()
 
-    async def profile(self, user_id: int):
+    async def profile(self, user_id: int, if_none_match: Optional[str] = None):
+        tag, not_modified = await self._current_tag(
+            user_id, profile_version_key(user_id), if_none_match
+        )
+        if not_modified:
+            return notmodifiedresponse(tag)
         async with self.db.db_session() as session:
             user = await session.execute(select(self.user).where(self.user.id == user_id))
             user = user.scalar_one_or_none()
-            return UserProfileResponse.model_validate(user, from_attributes=True)
+        return etagresponse(
+            UserProfileResponse.model_validate(user, from_attributes=True).model_dump_json(), tag
+        )
 
     async def set_user_notifications(self, user_id: int):
         async with self.db.db_session() as session:
@@ -229,4 +654,6 @@ class MessageService:
                 .values(notifications_bool=not user.notifications_bool)
             )
             await session.commit()
-            return emptyresponse(200)
+        async with self.redis.pipeline() as pipe:
+            await bump_profile_version(pipe, user_id)
+        return emptyresponse(200)
@@ -1,4 +1,9 @@
-from datetime import datetime, timedelta
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date, datetime, timedelta
+from typing import Tuple
+from uuid import UUID
+
+from fastapi.exceptions import HTTPException
 
 
 def find_next_weekday(available_weekdays):
@@ -12,3 +17,17 @@ def find_next_weekday(available_weekdays):
 
     days_ahead = (7 - today_weekday) + available_weekdays[0]
     return target_date + timedelta(days=days_ahead)
+
+
+def encode_cursor(start_send_date: date, msg_id: UUID) -> str:
+    raw = f"{start_send_date.isoformat()}|{msg_id}".encode()
+    return urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[date, UUID]:
+    try:
+        raw = urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        start_send_date, msg_id = raw.split("|")
+        return date.fromisoformat(start_send_date), UUID(msg_id)
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
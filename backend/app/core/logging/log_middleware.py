@@ -1,55 +1,117 @@
-import json
 import logging
-from time import time
+from random import random
+from time import perf_counter
+from typing import Optional
 
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
-from starlette.responses import Response
+from app.core.settings import settings
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 logger = logging.getLogger("app.request")
 
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        body = await request.body()
-        content_type = request.headers.get("content-type", "")
+def _decode_body(body: bytearray, content_type: str, truncated: bool) -> str:
+    if not body:
+        return ""
+    if "json" not in content_type and "text" not in content_type:
+        return f"<binary {len(body)} bytes>"
+    try:
+        text = body.decode("utf-8")
+    except UnicodeDecodeError:
+        return f"<undecodable {len(body)} bytes>"
+    return f"{text}...<truncated>" if truncated else text
+
+
+class _BodyCapture:
+    __slots__ = ("data", "limit", "truncated")
+
+    def __init__(self, limit: int) -> None:
+        self.data = bytearray()
+        self.limit = limit
+        self.truncated = False
+
+    def feed(self, chunk: bytes) -> None:
+        room = self.limit - len(self.data)
+        if len(chunk) > room:
+            self.truncated = True
+        if room > 0:
+            self.data += chunk[:room]
+
+
+class LoggingMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        log_settings = settings.logging_settings
+        self.capture = log_settings.log_body_capture
+        self.sample_rate = log_settings.log_body_sample_rate
+        self.max_bytes = log_settings.log_body_max_bytes
+        self.on_error = log_settings.log_body_on_error
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        sampled = self.capture and random() < self.sample_rate
+        # Bodies are kept only up to max_bytes, and only when they might be logged.
+        request_body: Optional[_BodyCapture] = None
+        response_body: Optional[_BodyCapture] = None
+        if sampled or (self.capture and self.on_error):
+            request_body = _BodyCapture(self.max_bytes)
+            response_body = _BodyCapture(self.max_bytes)
+        status_code = 500
+        content_type = ""
+
+        async def receive_wrapper() -> Message:
+            message = await receive()
+            if message["type"] == "http.request":
+                request_body.feed(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, content_type, response_body
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                for key, value in message.get("headers", ()):
+                    if key == b"content-type":
+                        content_type = value.decode("latin-1")
+                        break
+                if content_type.startswith("text/event-stream"):
+                    response_body = None
+            elif response_body is not None and message["type"] == "http.response.body":
+                response_body.feed(message.get("body", b""))
+            await send(message)
+
+        start = perf_counter()
         try:
-            if "application/json" in content_type or "text" in content_type:
-                body_str = body.decode("utf-8")
-            else:
-                body_str = f"<binary {len(body)} bytes>"
-        except UnicodeDecodeError:
-            body_str = f"<undecodable {len(body)} bytes>"
-
-        start = time()
-        response: Response = await call_next(request)
-        duration = round((time() - start) * 1000, 2)
-
-        log_data = {
-            "method": request.method,
-            "path": request.url.path,
-            "query": dict(request.query_params),
-            "request_body": body_str,
-            "status_code": response.status_code,
-            "duration_ms": duration,
-        }
-
-        if response.headers.get("content-type", "").startswith("application/json"):
-            response_body = b""
-            async for chunk in response.body_iterator:
-                response_body += chunk
-
-            async def new_body_iterator():
-                yield response_body
-
-            response.body_iterator = new_body_iterator()
-            try:
-                log_data["response_body"] = json.loads(response_body.decode())
-            except Exception:
-                try:
-                    log_data["response_body"] = response_body.decode()
-                except:  # noqa
-                    log_data["response_body"] = f"<undecodable {len(response_body)} bytes>"
-
-        logger.info(json.dumps(log_data, ensure_ascii=False))
-        return response
+            await self.app(
+                scope, receive_wrapper if request_body is not None else receive, send_wrapper
+            )
+        finally:
+            log_data = {
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope["query_string"].decode("latin-1"),
+                "status_code": status_code,
+                "duration_ms": round((perf_counter() - start) * 1000, 2),
+            }
+            if request_body is not None and (sampled or status_code >= 500):
+                request_type = ""
+                for key, value in scope["headers"]:
+                    if key == b"content-type":
+                        request_type = value.decode("latin-1")
+                        break
+                log_data["request_body"] = _decode_body(
+                    request_body.data, request_type, request_body.truncated
+                )
+                if response_body is not None:
+                    log_data["response_body"] = _decode_body(
+                        response_body.data, content_type, response_body.truncated
+                    )
+            logger.info(
+                "%s %s %s %sms",
+                log_data["method"],
+                log_data["path"],
+                status_code,
+                log_data["duration_ms"],
+                extra={"fields": log_data},
+            )
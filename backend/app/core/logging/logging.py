@@ -1,8 +1,14 @@
+import atexit
+import copy
+import json
 import logging
 import sys
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
+from queue import SimpleQueue
+from typing import Optional
 
+from app.core.settings import settings
 from colorlog import ColoredFormatter
 
 LOG_DIR = Path("logs")
@@ -10,8 +16,47 @@ LOG_DIR.mkdir(exist_ok=True)
 
 LOG_FORMAT = "[%(asctime)s] [%(levelname)s] [%(name)s:%(lineno)d] - %(message)s"
 
+_listener: Optional[QueueListener] = None
+_exception_formatter = logging.Formatter()
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "line": record.lineno,
+            "msg": record.getMessage(),
+        }
+        # Structured fields passed as extra={"fields": ...} land in the top-level object.
+        fields = getattr(record, "fields", None)
+        if fields:
+            data.update(fields)
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+class RecordQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only the parts that cannot cross threads are resolved here, formatting is left
+        # to the listener.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
 
 def setup_logging():
+    global _listener
+
+    stop_logging()
     logger = logging.getLogger()
     logger.setLevel(logging.INFO)
     logger.handlers.clear()
@@ -22,31 +67,47 @@ def setup_logging():
         backupCount=5,
         encoding="utf-8",
     )
-    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
-
-    color_formatter = ColoredFormatter(
-        "%(log_color)s" + LOG_FORMAT,
-        log_colors={
-            "DEBUG": "cyan",
-            "INFO": "green",
-            "WARNING": "yellow",
-            "ERROR": "red",
-            "CRITICAL": "bold_red",
-        },
-    )
+    file_handler.setFormatter(JSONFormatter())
+
     console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(color_formatter)
+    if settings.logging_settings.log_json:
+        console_handler.setFormatter(JSONFormatter())
+    else:
+        console_handler.setFormatter(
+            ColoredFormatter(
+                "%(log_color)s" + LOG_FORMAT,
+                log_colors={
+                    "DEBUG": "cyan",
+                    "INFO": "green",
+                    "WARNING": "yellow",
+                    "ERROR": "red",
+                    "CRITICAL": "bold_red",
+                },
+            )
+        )
 
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # The event loop only enqueues records, formatting and I/O run on the listener thread.
+    queue = SimpleQueue()
+    logger.addHandler(RecordQueueHandler(queue))
+    _listener = QueueListener(queue, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
 
     logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
     logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
 
 
-def get_logger(name: str = None) -> logging.Logger:
-    import inspect
+def stop_logging():
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
 
-    frame = inspect.stack()[1]
-    module = inspect.getmodule(frame[0])
-    return logging.getLogger(module.__name__ if module else "__main__")
+atexit.register(stop_logging)
+
+
+def get_logger(name: str = None) -> logging.Logger:
+    return logging.getLogger(name or sys._getframe(1).f_globals.get("__name__", "__main__"))
@@ -0,0 +1,138 @@
+import os
+from pathlib import Path
+from time import perf_counter
+
+from app.core.logging.logging import get_logger
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    multiprocess,
+    start_http_server,
+)
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = get_logger()
+
+# Multiprocess mode is chosen by prometheus_client at import time, so the directory has to
+# come from the process environment rather than from Settings.
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+if MULTIPROC_DIR:
+    Path(MULTIPROC_DIR).mkdir(parents=True, exist_ok=True)
+
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "SQL statement execution time",
+    ["operation"],
+    buckets=FAST_BUCKETS,
+)
+REDIS_COMMAND_DURATION = Histogram(
+    "redis_command_duration_seconds",
+    "Redis command round trip time",
+    ["command"],
+    buckets=FAST_BUCKETS,
+)
+SSE_CONNECTIONS = Gauge(
+    "sse_connections",
+    "Open SSE subscriptions",
+    multiprocess_mode="livesum",
+)
+SSE_DROPPED_EVENTS = Counter(
+    "sse_dropped_events",
+    "SSE frames dropped for slow consumers",
+)
+TELEGRAM_LATENESS = Histogram(
+    "telegram_fire_lateness_seconds",
+    "Delay between a reminder's scheduled fire time and send_telegram running",
+    buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600),
+)
+OUTBOX_LAG = Histogram(
+    "outbox_relay_lag_seconds",
+    "Delay between an outbox row being written and the relay applying it",
+    buckets=FAST_BUCKETS,
+)
+TELEGRAM_STREAM_LENGTH = Gauge(
+    "telegram_stream_length",
+    "Entries in the Telegram stream, acked ones are trimmed by the bot",
+    multiprocess_mode="mostrecent",
+)
+TIMER_LATENESS = Histogram(
+    "reminder_timer_lateness_seconds",
+    "Delay between a reminder's fire time and the worker timer dispatching it",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        streaming = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, streaming
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                for key, value in message.get("headers", ()):
+                    if key == b"content-type":
+                        streaming = value.startswith(b"text/event-stream")
+                        break
+            await send(message)
+
+        start = perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # SSE requests live as long as the connection, they are tracked by SSE_CONNECTIONS.
+            if not streaming:
+                route = scope.get("route")
+                HTTP_REQUEST_DURATION.labels(
+                    scope["method"], route.path if route else "unmatched", status_code
+                ).observe(perf_counter() - start)
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context.metrics_start = perf_counter()
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        operation = statement.lstrip().split(None, 1)[0].upper()
+        DB_QUERY_DURATION.labels(operation).observe(perf_counter() - context.metrics_start)
+
+
+def mark_process_dead() -> None:
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+# Served on its own port, which is only exposed inside the compose network. With several
+# uvicorn workers the first one to bind serves the merged multiprocess registry.
+def start_metrics_server(port: int) -> None:
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    try:
+        start_http_server(port, registry=registry)
+    except OSError as exc:
+        logger.debug(f"Metrics server not started on port {port}: {exc}")
@@ -0,0 +1,138 @@
+import asyncio
+from datetime import datetime, timezone
+from typing import List, Optional
+from uuid import UUID
+
+from app.api.user.cache import bump_version
+from app.core.logging.logging import get_logger
+from app.core.metrics import OUTBOX_LAG
+from app.core.settings import settings
+from app.core.taskiq.notifications import SNAPSHOT_FIELDS, notification_snapshot
+from app.core.taskiq.scheduling import apply_reschedules, forget_notifications
+from app.database.models import Message, Outbox
+from app.dependencies.db_dependency import DBDependency
+from app.dependencies.redis_dependency import RedisDependency
+from sqlalchemy import delete, func, select
+
+logger = get_logger()
+
+# Rows are applied in id order by one relay at a time, API processes share this lock.
+RELAY_LOCK = 7_253_110
+
+
+class OutboxRelay:
+    def __init__(self) -> None:
+        self._task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        self._running = False
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    async def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._running = True
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._running = False
+        if self._task is not None:
+            self._wake.set()
+            await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        outbox_settings = settings.outbox_settings
+        while self._running:
+            woken = self._wake.is_set()
+            self._wake.clear()
+            try:
+                drained = await self.drain(outbox_settings.outbox_batch_size)
+            except Exception as e:
+                logger.error(f"Outbox relay failed: {e}")
+                await asyncio.sleep(outbox_settings.outbox_poll_interval)
+                continue
+            if drained is None and woken:
+                # Another process holds the lock, retry soon so this process's rows are not
+                # left waiting for a poll.
+                await asyncio.sleep(outbox_settings.outbox_busy_retry)
+                self._wake.set()
+                continue
+            if drained is not None and drained >= outbox_settings.outbox_batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), outbox_settings.outbox_poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def drain(self, limit: int) -> Optional[int]:
+        db = DBDependency()
+        try:
+            async with db.db_session() as session:
+                locked = await session.execute(select(func.pg_try_advisory_xact_lock(RELAY_LOCK)))
+                if not locked.scalar_one():
+                    await session.rollback()
+                    return None
+                result = await session.execute(select(Outbox).order_by(Outbox.id).limit(limit))
+                entries = result.scalars().all()
+                if entries:
+                    await self._apply(session, entries)
+                    await session.execute(
+                        delete(Outbox).where(Outbox.id.in_([entry.id for entry in entries]))
+                    )
+                await session.commit()
+        finally:
+            await db.close()
+        return len(entries)
+
+    @staticmethod
+    async def _apply(session, entries: List[Outbox]) -> None:
+        fires = [fire for entry in entries for fire in entry.fires or () if fire[2] != fire[3]]
+        # Snapshots are rendered from the current row, a fire whose schedule id has since
+        # been replaced or whose message is gone only has its old entry removed.
+        wanted = {UUID(msg_id) for msg_id, _, _, new_id in fires if new_id}
+        rows = {}
+        if wanted:
+            result = await session.execute(
+                select(
+                    Message.id,
+                    Message.user_id,
+                    Message.start_fire_at,
+                    Message.end_fire_at,
+                    Message.start_schedule_id,
+                    Message.end_schedule_id,
+                    *(getattr(Message, field) for field in SNAPSHOT_FIELDS),
+                ).where(Message.id.in_(wanted))
+            )
+            rows = {str(row.id): row._mapping for row in result}
+        changes = []
+        for msg_id, kind, old_id, new_id in fires:
+            row = rows.get(msg_id) if new_id else None
+            if row is None or str(row[f"{kind}_schedule_id"]) != new_id:
+                if old_id:
+                    changes.append((old_id, None, msg_id, 0, None, None))
+                continue
+            changes.append(
+                (
+                    old_id,
+                    new_id,
+                    row["id"],
+                    row["user_id"],
+                    row[f"{kind}_fire_at"],
+                    notification_snapshot(row, kind == "start"),
+                )
+            )
+        await apply_reschedules(changes)
+        await forget_notifications([msg_id for entry in entries for msg_id in entry.forget or ()])
+        events = [entry for entry in entries if entry.event]
+        if events:
+            async with RedisDependency().pipeline() as pipe:
+                for entry in events:
+                    await bump_version(pipe, entry.user_id)
+                    pipe.publish(f"messages:{entry.user_id}", entry.event)
+        now = datetime.now(timezone.utc)
+        for entry in entries:
+            OUTBOX_LAG.observe((now - entry.created_at).total_seconds())
+
+
+relay = OutboxRelay()
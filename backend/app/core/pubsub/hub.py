@@ -0,0 +1,131 @@
+import asyncio
+from typing import Callable, Dict, List, Optional, Set
+
+from app.core.logging.logging import get_logger
+from app.core.metrics import SSE_CONNECTIONS, SSE_DROPPED_EVENTS
+from app.core.settings import settings
+from app.dependencies.redis_dependency import RedisDependency
+from app.utils.serialization import sse_frame
+from redis.asyncio import Redis
+from redis.asyncio.client import PubSub
+
+logger = get_logger()
+
+
+class Subscription:
+    __slots__ = ("channel", "queue", "dropped")
+
+    def __init__(self, channel: str, maxsize: int) -> None:
+        self.channel = channel
+        self.queue: asyncio.Queue[bytes] = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def push(self, frame: bytes) -> None:
+        # Slow consumers lose their oldest pending events instead of growing without bound.
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            SSE_DROPPED_EVENTS.inc()
+        self.queue.put_nowait(frame)
+
+
+class PubSubHub:
+    def __init__(self) -> None:
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._listeners: Dict[str, List[Callable[[str], None]]] = {}
+        self._pubsub: Optional[PubSub] = None
+        self._reader: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self._running = False
+        self._dropped = 0
+
+    async def _subscribe_channel(self, channel: str) -> None:
+        if self._pubsub is None:
+            self._pubsub = Redis(connection_pool=RedisDependency.init_pool()).pubsub()
+        await self._pubsub.subscribe(channel)
+        if self._reader is None or self._reader.done():
+            self._running = True
+            self._reader = asyncio.create_task(self._read())
+
+    async def subscribe(self, channel: str) -> Subscription:
+        sub = Subscription(channel, settings.sse_settings.sse_queue_size)
+        async with self._lock:
+            subs = self._subscribers.get(channel)
+            if subs is None:
+                if channel not in self._listeners:
+                    await self._subscribe_channel(channel)
+                subs = self._subscribers[channel] = set()
+            subs.add(sub)
+        SSE_CONNECTIONS.inc()
+        return sub
+
+    async def add_listener(self, channel: str, callback: Callable[[str], None]) -> None:
+        async with self._lock:
+            if channel not in self._listeners and channel not in self._subscribers:
+                await self._subscribe_channel(channel)
+            self._listeners.setdefault(channel, []).append(callback)
+
+    async def unsubscribe(self, sub: Subscription) -> None:
+        self._dropped += sub.dropped
+        SSE_CONNECTIONS.dec()
+        async with self._lock:
+            subs = self._subscribers.get(sub.channel)
+            if subs is None:
+                return
+            subs.discard(sub)
+            if not subs:
+                del self._subscribers[sub.channel]
+                if self._pubsub is not None and sub.channel not in self._listeners:
+                    await self._pubsub.unsubscribe(sub.channel)
+
+    async def _read(self) -> None:
+        while self._running:
+            try:
+                message = await self._pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=1.0
+                )
+            except Exception as e:
+                if not self._running:
+                    break
+                logger.error(f"Pubsub reader error: {e}")
+                await asyncio.sleep(1)
+                continue
+            if message is None or message["type"] != "message":
+                continue
+            for callback in self._listeners.get(message["channel"], ()):
+                try:
+                    callback(message["data"])
+                except Exception as e:
+                    logger.error(f"Pubsub listener error: {e}")
+            subs = self._subscribers.get(message["channel"])
+            if not subs:
+                continue
+            frame = sse_frame(message["data"])
+            for sub in subs:
+                sub.push(frame)
+
+    async def close(self) -> None:
+        self._running = False
+        if self._reader is not None:
+            self._reader.cancel()
+            try:
+                await self._reader
+            except asyncio.CancelledError:
+                pass
+            self._reader = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        self._subscribers.clear()
+        self._listeners.clear()
+
+    def stats(self) -> dict:
+        return {
+            "channels": len(self._subscribers),
+            "subscribers": sum(len(subs) for subs in self._subscribers.values()),
+            "dropped": self._dropped
+            + sum(sub.dropped for subs in self._subscribers.values() for sub in subs),
+        }
+
+
+hub = PubSubHub()
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import SecretStr
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -9,6 +11,11 @@ class DBSettings(BaseSettings):
     db_host: str
     db_port: int
     db_echo: bool
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: int = 30
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf8", extra="ignore")
 
@@ -21,6 +28,8 @@ class JWTSettings(BaseSettings):
     jwt_secret_key: SecretStr
     jwt_algorithm: str
     access_token_expire_min: int
+    token_cache_size: int = 10000
+    token_cache_ttl: int = 300
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf8", extra="ignore")
 
@@ -30,6 +39,13 @@ class RedisSettings(BaseSettings):
     redis_host: str
     redis_port: int
     redis_db: int
+    redis_max_connections: int = 100
+    redis_pool_timeout: int = 5
+    redis_health_check_interval: int = 30
+    telegram_stream: str = "telegram_stream"
+    telegram_stream_warn_length: int = 100000
+    message_cache_ttl: int = 300
+    message_version_ttl: int = 604800
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf8", extra="ignore")
 
@@ -38,10 +54,69 @@ class RedisSettings(BaseSettings):
         return f"redis://:{self.redis_pass.get_secret_value()}@{self.redis_host}:{self.redis_port}/{self.redis_db}"
 
 
+class SSESettings(BaseSettings):
+    sse_queue_size: int = 100
+    sse_heartbeat_interval: int = 15
+
+    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf8", extra="ignore")
+
+
+class SchedulerSettings(BaseSettings):
+    schedule_horizon_hours: int = 24
+    horizon_batch_size: int = 500
+    horizon_refresh_cron: str = "*/10 * * * *"
+    dispatch_batching: bool = True
+    dispatch_batch_size: int = 500
+    timer_enabled: bool = True
+    timer_tick: float = 0.05
+    timer_lookahead: int = 180
+    timer_prefetch_interval: float = 1.0
+    timer_lease_ttl: int = 15
+    timer_send_timeout: float = 30.0
+    reconcile_cron: str = "30 3 * * *"
+    reconcile_batch_size: int = 5000
+    reconcile_concurrency: int = 4
+    reconcile_catchup: int = 3600
+    reconcile_orphan_grace: float = 5.0
+
+    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf8", extra="ignore")
+
+
+class OutboxSettings(BaseSettings):
+    outbox_batch_size: int = 500
+    outbox_poll_interval: float = 1.0
+    outbox_busy_retry: float = 0.05
+
+    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf8", extra="ignore")
+
+
+class LoggingSettings(BaseSettings):
+    log_body_capture: bool = False
+    log_body_sample_rate: float = 0.01
+    log_body_max_bytes: int = 4096
+    log_body_on_error: bool = True
+    log_json: bool = True
+
+    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf8", extra="ignore")
+
+
+class MetricsSettings(BaseSettings):
+    worker_metrics_port: int = 9000
+    api_metrics_port: int = 9001
+    internal_token: Optional[SecretStr] = None
+
+    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf8", extra="ignore")
+
+
 class Settings(BaseSettings):
     db_settings: DBSettings = DBSettings()
     jwt_settings: JWTSettings = JWTSettings()
     redis_settings: RedisSettings = RedisSettings()
+    sse_settings: SSESettings = SSESettings()
+    scheduler_settings: SchedulerSettings = SchedulerSettings()
+    outbox_settings: OutboxSettings = OutboxSettings()
+    logging_settings: LoggingSettings = LoggingSettings()
+    metrics_settings: MetricsSettings = MetricsSettings()
 
     frontend_url: str
     bot_token: SecretStr
@@ -1,8 +1,51 @@
+from pathlib import Path
+
+from app.core.metrics import MULTIPROC_DIR
 from app.core.settings import settings
-from taskiq import TaskiqScheduler
-from taskiq_redis import ListRedisScheduleSource, RedisStreamBroker
+from app.core.taskiq.schedule_source import ZSetScheduleSource
+from app.core.taskiq.timer import ReminderTimer
+from app.dependencies.db_dependency import DBDependency
+from app.dependencies.redis_dependency import RedisDependency
+from taskiq import TaskiqEvents, TaskiqScheduler, TaskiqState
+from taskiq.middlewares.prometheus_middleware import PrometheusMiddleware
+from taskiq.schedule_sources import LabelScheduleSource
+from taskiq_redis import RedisStreamBroker
+
+SEND_TELEGRAM = "app.core.taskiq.tasks:send_telegram"
+SEND_TELEGRAM_BATCH = "app.core.taskiq.tasks:send_telegram_batch"
 
 broker = RedisStreamBroker(settings.redis_settings.redis_url)
-source = ListRedisScheduleSource(settings.redis_settings.redis_url)
+if MULTIPROC_DIR:
+    broker.add_middlewares(
+        PrometheusMiddleware(
+            metrics_path=Path(MULTIPROC_DIR),
+            server_port=settings.metrics_settings.worker_metrics_port,
+        )
+    )
+source = ZSetScheduleSource(
+    settings.redis_settings.redis_url,
+    coalesce=(
+        {SEND_TELEGRAM: SEND_TELEGRAM_BATCH}
+        if settings.scheduler_settings.dispatch_batching
+        else None
+    ),
+    coalesce_size=settings.scheduler_settings.dispatch_batch_size,
+)
+
+scheduler = TaskiqScheduler(broker, [source, LabelScheduleSource(broker)])
+timer = ReminderTimer(source)
+
+
+@broker.on_event(TaskiqEvents.WORKER_STARTUP)
+async def worker_startup(state: TaskiqState) -> None:
+    DBDependency.init_engine()
+    RedisDependency.init_pool()
+    if settings.scheduler_settings.timer_enabled:
+        await timer.start()
+
 
-scheduler = TaskiqScheduler(broker, [source])
+@broker.on_event(TaskiqEvents.WORKER_SHUTDOWN)
+async def worker_shutdown(state: TaskiqState) -> None:
+    await timer.stop()
+    await DBDependency.dispose_engine()
+    await RedisDependency.close_pool()
@@ -0,0 +1,98 @@
+import argparse
+import asyncio
+
+from app.core.logging.logging import get_logger
+from app.core.taskiq.broker import source
+from app.core.taskiq.reconcile import Reconciler
+from app.core.taskiq.scheduling import horizon_end
+from app.core.taskiq.tasks import load_schedule_horizon
+from app.database.models import Message
+from app.dependencies.db_dependency import DBDependency
+from app.dependencies.redis_dependency import RedisDependency
+from sqlalchemy import func, select, update
+
+logger = get_logger()
+
+# Keys written by taskiq_redis' ListRedisScheduleSource with its default prefix.
+LEGACY_PATTERNS = ("schedule:time:*", "schedule:data:*", "schedule:cron", "schedule:interval")
+
+
+async def detach_beyond_horizon(dry_run: bool) -> int:
+    # Rows keep the ids their legacy entries had. Past the horizon the id is cleared so the
+    # horizon loader plans the fire when it comes near, as for any new far-future reminder.
+    horizon = horizon_end()
+    detached = 0
+    db = DBDependency()
+    try:
+        async with db.db_session() as session:
+            for kind in ("start", "end"):
+                schedule_id = getattr(Message, f"{kind}_schedule_id")
+                clause = (schedule_id.is_not(None), getattr(Message, f"{kind}_fire_at") > horizon)
+                if dry_run:
+                    result = await session.execute(
+                        select(func.count()).select_from(Message).where(*clause)
+                    )
+                    detached += result.scalar_one()
+                    continue
+                result = await session.execute(
+                    update(Message)
+                    .where(*clause)
+                    .values({schedule_id.key: None, "updated_at": Message.updated_at})
+                )
+                detached += result.rowcount
+            await session.commit()
+    finally:
+        await db.close()
+    return detached
+
+
+async def drop_legacy_keys(dry_run: bool) -> int:
+    dropped = 0
+    async with RedisDependency().get_client() as client:
+        for pattern in LEGACY_PATTERNS:
+            keys = [key async for key in client.scan_iter(match=pattern, count=1000)]
+            for offset in range(0, len(keys), 1000):
+                if not dry_run:
+                    await client.unlink(*keys[offset : offset + 1000])
+            dropped += len(keys)
+    return dropped
+
+
+async def migrate(dry_run: bool = False, keep_legacy: bool = False) -> dict:
+    await DBDependency.initialize_tables()
+    stats = {"detached": await detach_beyond_horizon(dry_run)}
+    reconciler = Reconciler(dry_run)
+    await reconciler.restore_missing()
+    stats.update(reconciler.stats)
+    if not dry_run:
+        db = DBDependency()
+        try:
+            await load_schedule_horizon(db)
+        finally:
+            await db.close()
+    if not keep_legacy:
+        stats["legacy_keys"] = await drop_legacy_keys(dry_run)
+    stats["dry_run"] = dry_run
+    logger.info(f"Schedule migration finished: {stats}")
+    return stats
+
+
+async def main(args) -> None:
+    try:
+        print(await migrate(args.dry_run, args.keep_legacy))
+    finally:
+        await source.shutdown()
+        await DBDependency.dispose_engine()
+        await RedisDependency.close_pool()
+
+
+# One-off, after the scheduler running ListRedisScheduleSource is stopped and before the
+# new scheduler and workers start. Pending reminders are re-registered from Postgres, which
+# is the source of truth, and the legacy keys are removed.
+#
+#     python -m app.core.taskiq.migrate_schedules [--dry-run] [--keep-legacy]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--keep-legacy", action="store_true")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,52 @@
+from typing import Any, Mapping, Optional
+
+SNAPSHOT_FIELDS = (
+    "name",
+    "priority",
+    "payload",
+    "repeat",
+    "repeat_wd",
+    "repeat_rule",
+    "updated_at",
+)
+
+
+def render_text(name: Optional[str], priority: int, payload: Optional[dict], start: bool) -> str:
+    payload = payload or {}
+    header = f"<b>{name}</b>\n" if name else ""
+    priority_text = f"Приоритет: {priority}\n"
+    start_text = "Это первое напоминание.\n" if start else ""
+    if payload.get("description"):
+        content = f"Сообщение:\n{payload['description']}\n"
+    else:
+        content = ""
+    if payload.get("array"):
+        content += "Список:\n"
+        for item in payload["array"]:
+            for key, val in item.items():
+                indicator = "✅" if val else "❎"
+                content += f"{key}: {indicator}\n"
+        content += "\n"
+    return f"{header}Ваше напоминание.\n{priority_text}{content}{start_text}"
+
+
+def snapshot_fields(message: Any) -> dict:
+    return {field: getattr(message, field) for field in SNAPSHOT_FIELDS}
+
+
+# The snapshot travels in the schedule entry, so firing it needs no Postgres read. "v" is
+# the message's updated_at, the worker drops the entry when it no longer matches the
+# stamp kept under notification_key().
+def notification_snapshot(fields: Mapping[str, Any], start: bool) -> dict:
+    snapshot = {
+        "text": render_text(fields["name"], fields["priority"], fields["payload"], start),
+        "v": fields["updated_at"].isoformat(),
+        "start": start,
+    }
+    if start and fields.get("repeat"):
+        snapshot["repeat"] = {"wd": fields.get("repeat_wd"), "rule": fields.get("repeat_rule")}
+    return snapshot
+
+
+def notification_key(msg_id: Any) -> str:
+    return f"notification:version:{msg_id}"
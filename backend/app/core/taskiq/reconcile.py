@@ -0,0 +1,269 @@
+import argparse
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from app.core.logging.logging import get_logger
+from app.core.settings import settings
+from app.core.taskiq.broker import SEND_TELEGRAM, source
+from app.core.taskiq.notifications import (
+    SNAPSHOT_FIELDS,
+    notification_key,
+    notification_snapshot,
+)
+from app.core.taskiq.schedule_source import ZSetScheduleSource
+from app.core.taskiq.scheduling import apply_reschedules
+from app.database.models import Message
+from app.dependencies.db_dependency import DBDependency
+from app.dependencies.redis_dependency import RedisDependency
+from app.utils.serialization import loads
+from sqlalchemy import and_, or_
+from sqlalchemy.future import select
+
+logger = get_logger()
+
+COLUMNS = (
+    Message.id,
+    Message.user_id,
+    Message.is_active,
+    Message.send_start,
+    Message.start_fire_at,
+    Message.end_fire_at,
+    Message.start_schedule_id,
+    Message.end_schedule_id,
+    *(getattr(Message, field) for field in SNAPSHOT_FIELDS),
+)
+
+
+# A pending start fire is restored even when it is up to reconcile_catchup seconds overdue,
+# send_start only goes false once it has been delivered. End fires have no such flag, so
+# only future ones count.
+def _pending(row, kind: str, now: datetime, catchup: datetime) -> bool:
+    fire_at = row[f"{kind}_fire_at"]
+    if not row["is_active"] or row[f"{kind}_schedule_id"] is None or fire_at is None:
+        return False
+    if kind == "start":
+        return row["send_start"] and fire_at > catchup
+    return fire_at > now
+
+
+def _pending_clause(now: datetime, catchup: datetime):
+    return and_(
+        Message.is_active,
+        or_(
+            and_(
+                Message.start_schedule_id.is_not(None),
+                Message.send_start,
+                Message.start_fire_at > catchup,
+            ),
+            and_(Message.end_schedule_id.is_not(None), Message.end_fire_at > now),
+        ),
+    )
+
+
+def _entry_version(entry: bytes) -> Optional[str]:
+    return loads(entry)["kwargs"].get("snapshot", {}).get("v")
+
+
+async def _in_parallel(
+    chunks: AsyncIterator[list], handle: Callable[[list], Awaitable[None]], concurrency: int
+) -> None:
+    pending = set()
+    try:
+        async for chunk in chunks:
+            if len(pending) >= concurrency:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+            pending.add(asyncio.create_task(handle(chunk)))
+        await asyncio.gather(*pending)
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def _fetch(msg_ids, columns=COLUMNS) -> Dict[UUID, dict]:
+    db = DBDependency()
+    try:
+        async with db.db_session() as session:
+            result = await session.execute(select(*columns).where(Message.id.in_(msg_ids)))
+            return {row.id: row._mapping for row in result}
+    finally:
+        await db.close()
+
+
+class Reconciler:
+    def __init__(
+        self, dry_run: bool = False, schedule_source: Optional[ZSetScheduleSource] = None
+    ) -> None:
+        scheduler_settings = settings.scheduler_settings
+        self.dry_run = dry_run
+        self.source = schedule_source or source
+        self.batch_size = scheduler_settings.reconcile_batch_size
+        self.concurrency = scheduler_settings.reconcile_concurrency
+        self.now = datetime.now(timezone.utc)
+        self.catchup = self.now - timedelta(seconds=scheduler_settings.reconcile_catchup)
+        self.stats = Counter()
+
+    async def run(self) -> dict:
+        start = perf_counter()
+        await self.restore_missing()
+        restored_at = perf_counter()
+        await self.remove_orphans()
+        self.stats["restore_seconds"] = round(restored_at - start, 3)
+        self.stats["orphan_seconds"] = round(perf_counter() - restored_at, 3)
+        self.stats["rows_per_second"] = round(
+            self.stats["rows"] / max(restored_at - start, 1e-9), 1
+        )
+        stats = dict(self.stats, dry_run=self.dry_run)
+        logger.info(f"Schedule reconciliation finished: {stats}")
+        return stats
+
+    async def _rows(self) -> AsyncIterator[list]:
+        # A server-side cursor, so the whole table never sits in memory at once.
+        db = DBDependency()
+        try:
+            async with db.db_session() as session:
+                result = await session.stream(
+                    select(*COLUMNS)
+                    .where(_pending_clause(self.now, self.catchup))
+                    .execution_options(yield_per=self.batch_size)
+                )
+                async for rows in result.mappings().partitions(self.batch_size):
+                    yield rows
+        finally:
+            await db.close()
+
+    async def restore_missing(self) -> None:
+        await _in_parallel(self._rows(), self._check_rows, self.concurrency)
+
+    async def _check_rows(self, rows: list) -> None:
+        self.stats["rows"] += len(rows)
+        expected = [
+            (row, kind)
+            for row in rows
+            for kind in ("start", "end")
+            if _pending(row, kind, self.now, self.catchup)
+        ]
+        msg_ids = list({row["id"] for row, _ in expected})
+        schedule_ids = [row[f"{kind}_schedule_id"].hex for row, kind in expected]
+        async with RedisDependency().get_client() as client:
+            entries, stamps = await asyncio.gather(
+                self.source.get_entries(schedule_ids),
+                client.mget([notification_key(msg_id) for msg_id in msg_ids]),
+            )
+        stamps = dict(zip(msg_ids, stamps))
+        broken = []
+        for (row, kind), entry in zip(expected, entries):
+            version = row["updated_at"].isoformat()
+            if entry is None:
+                self.stats["missing"] += 1
+            elif stamps[row["id"]] != version or _entry_version(entry) != version:
+                self.stats["stale"] += 1
+            else:
+                continue
+            broken.append((row["id"], kind))
+        self.stats["expected"] += len(expected)
+        if broken and not self.dry_run:
+            await self._restore(broken)
+
+    async def _restore(self, broken: List[Tuple[UUID, str]]) -> None:
+        # The cursor's rows may be outdated by now, entries are rebuilt from a fresh read.
+        # A run can take minutes. An end fire that came due meanwhile may already have been
+        # delivered and deleted, so it is checked against the time of this read instead.
+        rows = await _fetch({msg_id for msg_id, _ in broken})
+        now = datetime.now(timezone.utc)
+        changes = []
+        for msg_id, kind in broken:
+            row = rows.get(msg_id)
+            if row is None or not _pending(row, kind, now, self.catchup):
+                continue
+            changes.append(
+                (
+                    None,
+                    row[f"{kind}_schedule_id"],
+                    msg_id,
+                    row["user_id"],
+                    row[f"{kind}_fire_at"],
+                    notification_snapshot(row, kind == "start"),
+                )
+            )
+        await apply_reschedules(changes)
+        self.stats["restored"] += len(changes)
+
+    async def remove_orphans(self) -> None:
+        candidates: List[Tuple[str, UUID]] = []
+
+        async def check(entries: List[Tuple[str, bytes]]) -> None:
+            self.stats["entries"] += len(entries)
+            candidates.extend(await self._orphans(entries))
+
+        await _in_parallel(self.source.scan_entries(self.batch_size), check, self.concurrency)
+        if not candidates:
+            return
+        # An entry can be written shortly before the row that references it is committed,
+        # so only those still unreferenced after the grace period are removed.
+        await asyncio.sleep(settings.scheduler_settings.reconcile_orphan_grace)
+        for offset in range(0, len(candidates), self.batch_size):
+            orphans = await self._unreferenced(candidates[offset : offset + self.batch_size])
+            self.stats["orphans"] += len(orphans)
+            if orphans and not self.dry_run:
+                await self.source.delete_schedules(orphans)
+                self.stats["removed"] += len(orphans)
+
+    async def _orphans(self, entries: List[Tuple[str, bytes]]) -> List[Tuple[str, UUID]]:
+        scheduled = []
+        for schedule_id, entry in entries:
+            task = loads(entry)
+            if task.get("task_name") == SEND_TELEGRAM:
+                scheduled.append((schedule_id, UUID(str(task["args"][0]))))
+        unreferenced = set(await self._unreferenced(scheduled))
+        return [item for item in scheduled if item[0] in unreferenced]
+
+    @staticmethod
+    async def _unreferenced(scheduled: List[Tuple[str, UUID]]) -> List[str]:
+        if not scheduled:
+            return []
+        rows = await _fetch(
+            {msg_id for _, msg_id in scheduled},
+            (Message.id, Message.start_schedule_id, Message.end_schedule_id),
+        )
+        unreferenced = []
+        for schedule_id, msg_id in scheduled:
+            row = rows.get(msg_id)
+            if row is None or UUID(schedule_id) not in (
+                row["start_schedule_id"],
+                row["end_schedule_id"],
+            ):
+                unreferenced.append(schedule_id)
+        return unreferenced
+
+
+async def reconcile(dry_run: bool = False) -> dict:
+    return await Reconciler(dry_run).run()
+
+
+async def main(args) -> None:
+    scheduler_settings = settings.scheduler_settings
+    if args.batch_size:
+        scheduler_settings.reconcile_batch_size = args.batch_size
+    if args.concurrency:
+        scheduler_settings.reconcile_concurrency = args.concurrency
+    try:
+        print(await reconcile(args.dry_run))
+    finally:
+        await source.shutdown()
+        await DBDependency.dispose_engine()
+        await RedisDependency.close_pool()
+
+
+# python -m app.core.taskiq.reconcile [--dry-run] [--batch-size N] [--concurrency N]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=None)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,360 @@
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from app.core.logging.logging import get_logger
+from app.utils.serialization import dumps_str
+from redis.asyncio import BlockingConnectionPool, Redis
+from taskiq import ScheduledTask, ScheduleSource
+
+logger = get_logger()
+
+ADD_SCRIPT = """
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[3])
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+"""
+
+DELETE_SCRIPT = """
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('ZREM', KEYS[3], ARGV[1])
+redis.call('ZREM', KEYS[4], ARGV[1])
+redis.call('ZREM', KEYS[6], ARGV[1])
+return redis.call('HDEL', KEYS[2], ARGV[1])
+"""
+
+RESCHEDULE_SCRIPT = """
+if ARGV[1] ~= '' then
+    redis.call('ZREM', KEYS[1], ARGV[1])
+    redis.call('ZREM', KEYS[3], ARGV[1])
+    redis.call('ZREM', KEYS[4], ARGV[1])
+    redis.call('ZREM', KEYS[6], ARGV[1])
+    redis.call('HDEL', KEYS[2], ARGV[1])
+end
+if ARGV[2] ~= '' then
+    redis.call('HSET', KEYS[2], ARGV[2], ARGV[4])
+    redis.call('ZADD', KEYS[1], ARGV[3], ARGV[2])
+end
+"""
+
+POP_DUE_SCRIPT = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #ids == 0 then
+    return {}
+end
+redis.call('ZREM', KEYS[1], unpack(ids))
+for _, id in ipairs(ids) do
+    redis.call('ZADD', KEYS[3], ARGV[1], id)
+end
+return redis.call('HMGET', KEYS[2], unpack(ids))
+"""
+
+REQUEUE_SCRIPT = """
+local ids = redis.call('ZRANGE', KEYS[3], 0, -1, 'WITHSCORES')
+for i = 1, #ids, 2 do
+    redis.call('ZADD', KEYS[1], ids[i + 1], ids[i])
+end
+redis.call('DEL', KEYS[3])
+return #ids / 2
+"""
+
+# The timer lease is taken over only once it has expired, and the new holder puts the
+# previous holder's claimed entries back first, so none of them is lost or fired twice.
+# Entries handed off before ARGV[3] belong to a send that never finished, whoever holds the
+# lease puts those back as well.
+LEASE_SCRIPT = """
+local holder = redis.call('GET', KEYS[5])
+if holder and holder ~= ARGV[1] then
+    return 0
+end
+local stale = redis.call('ZRANGEBYSCORE', KEYS[6], '-inf', '(' .. ARGV[3], 'WITHSCORES')
+for i = 1, #stale, 2 do
+    redis.call('ZADD', KEYS[1], stale[i + 1], stale[i])
+    redis.call('ZREM', KEYS[6], stale[i])
+end
+if holder then
+    redis.call('PEXPIRE', KEYS[5], ARGV[2])
+    return 1
+end
+redis.call('SET', KEYS[5], ARGV[1], 'PX', ARGV[2])
+local ids = redis.call('ZRANGE', KEYS[4], 0, -1, 'WITHSCORES')
+for i = 1, #ids, 2 do
+    redis.call('ZADD', KEYS[1], ids[i + 1], ids[i])
+end
+redis.call('DEL', KEYS[4])
+return 2
+"""
+
+RELEASE_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[5]) ~= ARGV[1] then
+    return 0
+end
+local ids = redis.call('ZRANGE', KEYS[4], 0, -1, 'WITHSCORES')
+for i = 1, #ids, 2 do
+    redis.call('ZADD', KEYS[1], ids[i + 1], ids[i])
+end
+redis.call('DEL', KEYS[4], KEYS[5])
+return #ids / 2
+"""
+
+CLAIM_SCRIPT = """
+if redis.call('GET', KEYS[5]) ~= ARGV[3] then
+    return {}
+end
+local entries = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'WITHSCORES', 'LIMIT', 0, ARGV[2])
+if #entries == 0 then
+    return {}
+end
+local ids = {}
+for i = 1, #entries, 2 do
+    ids[#ids + 1] = entries[i]
+    redis.call('ZADD', KEYS[4], entries[i + 1], entries[i])
+end
+redis.call('ZREM', KEYS[1], unpack(ids))
+return redis.call('HMGET', KEYS[2], unpack(ids))
+"""
+
+# Claimed entries are moved to the sending set, scored by the hand-off time ARGV[1], as
+# they are handed to the dispatcher. Only the ids still claimed are moved and returned, the
+# others were requeued by a new holder.
+HANDOFF_SCRIPT = """
+local moved = {}
+for i = 2, #ARGV do
+    if redis.call('ZREM', KEYS[4], ARGV[i]) == 1 then
+        redis.call('ZADD', KEYS[6], ARGV[1], ARGV[i])
+        moved[#moved + 1] = ARGV[i]
+    end
+end
+return moved
+"""
+
+UNCLAIM_SCRIPT = """
+for _, id in ipairs(ARGV) do
+    local score = redis.call('ZSCORE', KEYS[6], id)
+    if score then
+        redis.call('ZREM', KEYS[6], id)
+        redis.call('ZADD', KEYS[1], score, id)
+    end
+end
+"""
+
+
+# Due entries are parked in the in-flight set until post_send, so a scheduler crash
+# between popping and sending re-queues them on the next startup.
+#
+# A worker-side timer can instead claim entries some time ahead of their fire time. Claimed
+# entries sit in their own set under a lease, and so do the ones it is sending. The
+# scheduler's requeue leaves both alone, the lease holder recovers them.
+#
+# Tasks listed in `coalesce` are not sent one by one: entries that come due together are
+# merged into one schedule of the mapped batch task, whose single argument is the list of
+# {"args", "kwargs"} of the merged entries.
+class ZSetScheduleSource(ScheduleSource):
+    def __init__(
+        self,
+        url: str,
+        prefix: str = "zschedule",
+        batch_size: int = 1000,
+        coalesce: Optional[Dict[str, str]] = None,
+        coalesce_size: int = 500,
+        max_connection_pool_size: Optional[int] = None,
+        **connection_kwargs: Any,
+    ) -> None:
+        super().__init__()
+        self._keys = [
+            f"{prefix}:due",
+            f"{prefix}:data",
+            f"{prefix}:inflight",
+            f"{prefix}:claimed",
+            f"{prefix}:lease",
+            f"{prefix}:sending",
+        ]
+        self._batch_size = batch_size
+        self._coalesce = coalesce or {}
+        self._coalesce_size = coalesce_size
+        self._coalesced: Dict[str, List[str]] = {}
+        self._pool = BlockingConnectionPool.from_url(
+            url=url, max_connections=max_connection_pool_size, **connection_kwargs
+        )
+        self._redis = Redis(connection_pool=self._pool)
+        self._add = self._redis.register_script(ADD_SCRIPT)
+        self._delete = self._redis.register_script(DELETE_SCRIPT)
+        self._reschedule = self._redis.register_script(RESCHEDULE_SCRIPT)
+        self._pop_due = self._redis.register_script(POP_DUE_SCRIPT)
+        self._requeue = self._redis.register_script(REQUEUE_SCRIPT)
+        self._lease = self._redis.register_script(LEASE_SCRIPT)
+        self._release_lease = self._redis.register_script(RELEASE_LEASE_SCRIPT)
+        self._claim = self._redis.register_script(CLAIM_SCRIPT)
+        self._hand_off = self._redis.register_script(HANDOFF_SCRIPT)
+        self._unclaim = self._redis.register_script(UNCLAIM_SCRIPT)
+
+    @staticmethod
+    def _score(schedule: ScheduledTask) -> float:
+        if schedule.time is None:
+            raise ValueError("ZSetScheduleSource only supports time based schedules")
+        time = schedule.time
+        if time.tzinfo is None:
+            time = time.replace(tzinfo=timezone.utc)
+        return time.timestamp()
+
+    @staticmethod
+    def _dump(schedule: ScheduledTask) -> str:
+        return dumps_str(schedule.model_dump(mode="json"))
+
+    async def startup(self) -> None:
+        requeued = await self._requeue(keys=self._keys)
+        if requeued:
+            logger.warning(f"Requeued {requeued} in-flight schedules")
+
+    async def shutdown(self) -> None:
+        await self._redis.aclose()
+        await self._pool.aclose()
+
+    async def add_schedule(self, schedule: ScheduledTask) -> None:
+        await self._add(
+            keys=self._keys,
+            args=[schedule.schedule_id, self._score(schedule), self._dump(schedule)],
+        )
+
+    async def add_schedules(self, schedules: List[ScheduledTask]) -> None:
+        # One HSET and one ZADD in a MULTI, as atomic as ADD_SCRIPT but without a script
+        # call per entry.
+        if not schedules:
+            return
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hset(
+                self._keys[1],
+                mapping={schedule.schedule_id: self._dump(schedule) for schedule in schedules},
+            )
+            pipe.zadd(
+                self._keys[0],
+                {schedule.schedule_id: self._score(schedule) for schedule in schedules},
+            )
+            await pipe.execute()
+
+    async def delete_schedule(self, schedule_id: str) -> None:
+        await self._delete(keys=self._keys, args=[schedule_id])
+
+    async def delete_schedules(self, schedule_ids: List[str]) -> None:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for schedule_id in schedule_ids:
+                await self._delete(keys=self._keys, args=[schedule_id], client=pipe)
+            await pipe.execute()
+
+    def _reschedule_args(
+        self, old_schedule_id: Optional[str], schedule: Optional[ScheduledTask]
+    ) -> list:
+        if schedule is None:
+            return [old_schedule_id or "", "", 0, ""]
+        return [
+            old_schedule_id or "",
+            schedule.schedule_id,
+            self._score(schedule),
+            self._dump(schedule),
+        ]
+
+    async def reschedule(
+        self, old_schedule_id: Optional[str], schedule: Optional[ScheduledTask]
+    ) -> None:
+        await self._reschedule(
+            keys=self._keys, args=self._reschedule_args(old_schedule_id, schedule)
+        )
+
+    async def reschedules(
+        self, changes: List[Tuple[Optional[str], Optional[ScheduledTask]]]
+    ) -> None:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for old_schedule_id, schedule in changes:
+                await self._reschedule(
+                    keys=self._keys,
+                    args=self._reschedule_args(old_schedule_id, schedule),
+                    client=pipe,
+                )
+            await pipe.execute()
+
+    async def get_schedules(self) -> List[ScheduledTask]:
+        now = datetime.now(timezone.utc).timestamp()
+        schedules = []
+        while True:
+            raw = await self._pop_due(keys=self._keys, args=[now, self._batch_size])
+            schedules.extend(ScheduledTask.model_validate_json(item) for item in raw if item)
+            if len(raw) < self._batch_size:
+                return self._coalesce_due(schedules) if self._coalesce else schedules
+
+    def _coalesce_due(self, schedules: List[ScheduledTask]) -> List[ScheduledTask]:
+        result = []
+        groups: Dict[str, List[ScheduledTask]] = {}
+        for schedule in schedules:
+            if schedule.task_name in self._coalesce:
+                groups.setdefault(self._coalesce[schedule.task_name], []).append(schedule)
+            else:
+                result.append(schedule)
+        for task_name, group in groups.items():
+            for offset in range(0, len(group), self._coalesce_size):
+                chunk = group[offset : offset + self._coalesce_size]
+                batch = ScheduledTask(
+                    task_name=task_name,
+                    labels={},
+                    args=[[{"args": item.args, "kwargs": item.kwargs} for item in chunk]],
+                    kwargs={},
+                    schedule_id=uuid4().hex,
+                    time=max(item.time for item in chunk),
+                )
+                self._coalesced[batch.schedule_id] = [item.schedule_id for item in chunk]
+                result.append(batch)
+        return result
+
+    async def post_send(self, task: ScheduledTask) -> None:
+        merged = self._coalesced.pop(task.schedule_id, None)
+        if merged is None:
+            await self.delete_schedule(task.schedule_id)
+        else:
+            await self.delete_schedules(merged)
+
+    async def acquire_lease(self, token: str, ttl: float, stale_before: float) -> int:
+        # 0: held by someone else, 1: renewed, 2: newly acquired.
+        return await self._lease(keys=self._keys, args=[token, int(ttl * 1000), stale_before])
+
+    async def release_lease(self, token: str) -> int:
+        return await self._release_lease(keys=self._keys, args=[token])
+
+    async def claim(self, until: datetime, token: str) -> List[ScheduledTask]:
+        schedules = []
+        while True:
+            raw = await self._claim(
+                keys=self._keys, args=[until.timestamp(), self._batch_size, token]
+            )
+            schedules.extend(ScheduledTask.model_validate_json(item) for item in raw if item)
+            if len(raw) < self._batch_size:
+                return schedules
+
+    async def hand_off(self, schedule_ids: List[str]) -> List[str]:
+        if not schedule_ids:
+            return []
+        moved = await self._hand_off(
+            keys=self._keys, args=[datetime.now(timezone.utc).timestamp(), *schedule_ids]
+        )
+        return [key if isinstance(key, str) else key.decode() for key in moved]
+
+    async def unclaim(self, schedule_ids: List[str]) -> None:
+        if schedule_ids:
+            await self._unclaim(keys=self._keys, args=schedule_ids)
+
+    async def get_entries(self, schedule_ids: List[str]) -> List[Optional[bytes]]:
+        if not schedule_ids:
+            return []
+        return await self._redis.hmget(self._keys[1], schedule_ids)
+
+    async def scan_entries(self, count: int) -> AsyncIterator[List[Tuple[str, bytes]]]:
+        cursor = 0
+        while True:
+            cursor, entries = await self._redis.hscan(self._keys[1], cursor, count=count)
+            if entries:
+                yield [
+                    (key if isinstance(key, str) else key.decode(), value)
+                    for key, value in entries.items()
+                ]
+            if not cursor:
+                return
+
+    async def count(self) -> int:
+        return await self._redis.zcard(self._keys[0])
@@ -0,0 +1,136 @@
+from datetime import date, datetime, time, timedelta, timezone
+from typing import List, Optional, Tuple, Union
+from uuid import UUID, uuid4
+
+from app.core.settings import settings
+from app.core.taskiq.broker import SEND_TELEGRAM, source
+from app.core.taskiq.notifications import notification_key
+from app.dependencies.redis_dependency import RedisDependency
+from taskiq import ScheduledTask
+
+
+def fire_datetime(send_date: Optional[date], send_time: Optional[time]) -> Optional[datetime]:
+    if send_date is None:
+        return None
+    return datetime.combine(send_date, send_time or time(), timezone.utc)
+
+
+def horizon_end() -> datetime:
+    return datetime.now(timezone.utc) + timedelta(
+        hours=settings.scheduler_settings.schedule_horizon_hours
+    )
+
+
+def planned_schedule_id(
+    fire_at: Optional[datetime], horizon: Optional[datetime] = None
+) -> Optional[UUID]:
+    # The id is stored with the row, the outbox relay adds the entry itself after commit.
+    if fire_at is None or fire_at > (horizon or horizon_end()):
+        return None
+    return uuid4()
+
+
+def _schedule_key(schedule_id: Optional[Union[str, UUID]]) -> Optional[str]:
+    return UUID(str(schedule_id)).hex if schedule_id else None
+
+
+def _build_schedule(
+    msg_id: UUID,
+    user_id: int,
+    fire_at: Optional[datetime],
+    snapshot: Optional[dict] = None,
+    schedule_id: Optional[str] = None,
+) -> Optional[ScheduledTask]:
+    # Far-future fire times stay in Postgres only, load_schedule_horizon brings them in later.
+    # A given schedule_id means the caller has already checked the horizon.
+    if fire_at is None or (schedule_id is None and fire_at > horizon_end()):
+        return None
+    kwargs = {"fire_at": fire_at.isoformat()}
+    if snapshot is not None:
+        kwargs["snapshot"] = snapshot
+    return ScheduledTask(
+        task_name=SEND_TELEGRAM,
+        labels={},
+        args=[str(msg_id), user_id],
+        kwargs=kwargs,
+        schedule_id=schedule_id or uuid4().hex,
+        time=fire_at,
+    )
+
+
+async def _stamp(schedules: List[Optional[ScheduledTask]]) -> None:
+    # The stamp is written before the entry, so a fresh entry is never taken for a stale one.
+    # It outlives the latest fire it covers by a horizon, for fires that run late. A stamp
+    # that expires anyway only costs the worker a Postgres read.
+    now = datetime.now(timezone.utc)
+    margin = settings.scheduler_settings.schedule_horizon_hours * 3600
+    stamps = {}
+    for schedule in schedules:
+        if schedule is None or "snapshot" not in schedule.kwargs:
+            continue
+        ttl = max(int((schedule.time - now).total_seconds()), margin) + margin
+        msg_id = schedule.args[0]
+        stamps[msg_id] = (
+            schedule.kwargs["snapshot"]["v"],
+            max(ttl, stamps[msg_id][1]) if msg_id in stamps else ttl,
+        )
+    if not stamps:
+        return
+    async with RedisDependency().pipeline() as pipe:
+        for msg_id, (version, ttl) in stamps.items():
+            pipe.set(notification_key(msg_id), version, ex=ttl)
+
+
+async def forget_notifications(msg_ids: List[Union[str, UUID]]) -> None:
+    if msg_ids:
+        async with RedisDependency().get_client() as client:
+            await client.delete(*(notification_key(msg_id) for msg_id in msg_ids))
+
+
+async def schedule_fires(
+    fires: List[Tuple[UUID, int, Optional[datetime], Optional[dict]]],
+) -> List[Optional[str]]:
+    schedules = [_build_schedule(*fire) for fire in fires]
+    pending = [schedule for schedule in schedules if schedule is not None]
+    if pending:
+        await _stamp(pending)
+        await source.add_schedules(pending)
+    return [schedule.schedule_id if schedule else None for schedule in schedules]
+
+
+async def apply_reschedules(
+    changes: List[
+        Tuple[
+            Optional[Union[str, UUID]],
+            Optional[Union[str, UUID]],
+            UUID,
+            int,
+            Optional[datetime],
+            Optional[dict],
+        ]
+    ],
+) -> None:
+    # For schedule ids that were already written to Postgres: (old_id, new_id, msg_id, ...).
+    if not changes:
+        return
+    schedules = [
+        (
+            _build_schedule(msg_id, user_id, fire_at, snapshot, _schedule_key(new_id))
+            if new_id
+            else None
+        )
+        for _, new_id, msg_id, user_id, fire_at, snapshot in changes
+    ]
+    await _stamp(schedules)
+    # An entry is always added before any change that replaces it, so plain additions can
+    # go first, in bulk.
+    added = [schedule for change, schedule in zip(changes, schedules) if not change[0] and schedule]
+    replaced = [
+        (_schedule_key(change[0]), schedule)
+        for change, schedule in zip(changes, schedules)
+        if change[0]
+    ]
+    if added:
+        await source.add_schedules(added)
+    if replaced:
+        await source.reschedules(replaced)
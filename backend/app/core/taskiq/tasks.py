@@ -1,58 +1,356 @@
-import json
-from typing import Annotated
+from datetime import datetime, timezone
+from typing import Annotated, List, Optional, Tuple
 from uuid import UUID
 
+from app.api.user.cache import bump_version
 from app.core.logging.logging import get_logger
-from app.core.taskiq.broker import broker
+from app.core.metrics import TELEGRAM_LATENESS, TELEGRAM_STREAM_LENGTH
+from app.core.settings import settings
+from app.core.taskiq.broker import SEND_TELEGRAM, broker, timer
+from app.core.taskiq.notifications import (
+    SNAPSHOT_FIELDS,
+    notification_key,
+    notification_snapshot,
+    render_text,
+    snapshot_fields,
+)
+from app.core.taskiq.reconcile import reconcile
+from app.core.taskiq.scheduling import (
+    apply_reschedules,
+    fire_datetime,
+    horizon_end,
+    planned_schedule_id,
+    schedule_fires,
+)
 from app.database.models import Message
-from app.dependencies.db_dependency import DBDependency
+from app.dependencies.db_dependency import DBDependency, get_db
 from app.dependencies.redis_dependency import RedisDependency
-from sqlalchemy import update
+from app.utils.recurrence import next_occurrence
+from app.utils.serialization import dumps
+from sqlalchemy import (
+    ARRAY,
+    Date,
+    DateTime,
+    Uuid,
+    any_,
+    column,
+    literal,
+    tuple_,
+    update,
+    values,
+)
 from sqlalchemy.future import select
-from taskiq import TaskiqDepends
+from taskiq import ScheduledTask, TaskiqDepends
+from taskiq.kicker import AsyncKicker
 
 logger = get_logger()
 
 
+def _observe_lateness(fire_ats: List[Optional[str]], now: datetime) -> None:
+    for fire_at in fire_ats:
+        if fire_at:
+            TELEGRAM_LATENESS.observe((now - datetime.fromisoformat(fire_at)).total_seconds())
+
+
+# The stream is never trimmed by length here, that would drop entries the bot has not
+# acked yet. The bot trims acked ones, a stream that keeps growing means it is not consuming.
+async def _push(redis: RedisDependency, payloads: List[Tuple[int, str]], started_users) -> None:
+    if not payloads:
+        return
+    redis_settings = settings.redis_settings
+    async with redis.get_client() as client:
+        async with client.pipeline(transaction=False) as pipe:
+            for user_id in started_users:
+                await bump_version(pipe, user_id)
+            for user_id, text in payloads:
+                pipe.xadd(
+                    redis_settings.telegram_stream,
+                    {"payload": dumps({"text": text, "user_id": user_id})},
+                )
+            pipe.xlen(redis_settings.telegram_stream)
+            length = (await pipe.execute())[-1]
+    TELEGRAM_STREAM_LENGTH.set(length)
+    if length > redis_settings.telegram_stream_warn_length:
+        logger.warning(f"Telegram stream holds {length} entries, is the bot consuming?")
+
+
+async def _advance_started(messages: List[Message], now: datetime) -> List[dict]:
+    # Every row gets the same keys so the bulk UPDATE goes out as a single statement.
+    rows = [
+        {
+            "id": msg.id,
+            "send_start": False,
+            "start_send_date": msg.start_send_date,
+            "start_fire_at": msg.start_fire_at,
+            "start_schedule_id": msg.start_schedule_id,
+            "updated_at": msg.updated_at,
+        }
+        for msg in messages
+    ]
+    repeats = []
+    for row, msg in zip(rows, messages):
+        if not msg.repeat:
+            continue
+        next_fire = next_occurrence(
+            fire_datetime(msg.start_send_date, msg.start_send_time),
+            msg.repeat_wd,
+            msg.repeat_rule,
+            after=now,
+        )
+        if next_fire:
+            row.update(send_start=True, start_send_date=next_fire.date(), start_fire_at=next_fire)
+            repeats.append((row, msg, next_fire))
+    schedule_ids = await schedule_fires(
+        [
+            (row["id"], msg.user_id, next_fire, notification_snapshot(snapshot_fields(msg), True))
+            for row, msg, next_fire in repeats
+        ]
+    )
+    for (row, _, _), schedule_id in zip(repeats, schedule_ids):
+        row["start_schedule_id"] = schedule_id
+    return rows
+
+
+# Entries scheduled before snapshots existed carry no text, they are rendered from Postgres.
+async def _dispatch(
+    db: DBDependency, redis: RedisDependency, fires: List[Tuple[UUID, Optional[str]]]
+) -> None:
+    now = datetime.now(timezone.utc)
+    _observe_lateness([fire_at for _, fire_at in fires], now)
+    ids = list({msg_id for msg_id, _ in fires})
+    async with db.db_session() as session:
+        rows = await session.execute(
+            select(Message).where(Message.id == any_(literal(ids, ARRAY(Uuid))))
+        )
+        messages = {msg.id: msg for msg in rows.scalars()}
+        started = {}
+        payloads = []
+        for msg_id, _ in fires:
+            msg = messages.get(msg_id)
+            if msg is None:
+                logger.warning(f"Message {msg_id} is gone, skipping its reminder")
+                continue
+            # The start and end reminders of a message can fire in the same tick, only the
+            # first of them is the start one.
+            start = msg.send_start and msg_id not in started
+            if start:
+                started[msg_id] = msg
+            payloads.append((msg.user_id, render_text(msg.name, msg.priority, msg.payload, start)))
+        if started:
+            await session.execute(
+                update(Message), await _advance_started(list(started.values()), now)
+            )
+            await session.commit()
+    await _push(redis, payloads, {msg.user_id for msg in started.values()})
+    logger.info(f"Dispatched {len(payloads)} reminders, {len(started)} start notices")
+
+
+async def _current_versions(db: DBDependency, msg_ids: List[UUID]) -> dict:
+    async with db.db_session() as session:
+        rows = await session.execute(
+            select(Message.id, Message.updated_at).where(
+                Message.id == any_(literal(msg_ids, ARRAY(Uuid)))
+            )
+        )
+        return {msg_id: updated_at.isoformat() for msg_id, updated_at in rows}
+
+
+async def _deliver(
+    db: DBDependency, redis: RedisDependency, fires: List[Tuple[UUID, int, str, dict]]
+) -> None:
+    now = datetime.now(timezone.utc)
+    _observe_lateness([fire_at for _, _, fire_at, _ in fires], now)
+    async with redis.get_client() as client:
+        stamps = await client.mget([notification_key(msg_id) for msg_id, *_ in fires])
+    # A missing stamp says nothing about the entry, the version is read from Postgres instead.
+    # Only a version that differs marks the entry stale.
+    unknown = list({fire[0] for fire, stamp in zip(fires, stamps) if stamp is None})
+    if unknown:
+        versions = await _current_versions(db, unknown)
+        stamps = [
+            versions.get(fire[0]) if stamp is None else stamp for fire, stamp in zip(fires, stamps)
+        ]
+    fresh = [fire for fire, stamp in zip(fires, stamps) if stamp == fire[3]["v"]]
+    finished = []
+    repeats = []
+    for msg_id, user_id, fire_at, snapshot in fresh:
+        if not snapshot["start"]:
+            continue
+        repeat = snapshot.get("repeat")
+        next_fire = repeat and next_occurrence(
+            datetime.fromisoformat(fire_at), repeat["wd"], repeat["rule"], after=now
+        )
+        if next_fire:
+            repeats.append((msg_id, user_id, next_fire, snapshot))
+        else:
+            finished.append((msg_id, datetime.fromisoformat(snapshot["v"])))
+    # Only start notices change state, and they are written back without reading the rows.
+    # Each write only applies while the row is still at the snapshot's version, so an edit
+    # made since the stamp check is never undone. updated_at is kept as it is so the write
+    # does not invalidate the other snapshots.
+    advanced = set()
+    if finished or repeats:
+        horizon = horizon_end()
+        planned = [planned_schedule_id(next_fire, horizon) for _, _, next_fire, _ in repeats]
+        async with db.db_session() as session:
+            if finished:
+                await session.execute(
+                    update(Message)
+                    .where(tuple_(Message.id, Message.updated_at).in_(finished))
+                    .values(send_start=False, updated_at=Message.updated_at)
+                )
+            if repeats:
+                table = Message.__table__
+                rows = values(
+                    column("id", Uuid()),
+                    column("version", DateTime(timezone=True)),
+                    column("send_date", Date()),
+                    column("fire_at", DateTime(timezone=True)),
+                    column("schedule_id", Uuid()),
+                    name="repeats",
+                ).data(
+                    [
+                        (
+                            msg_id,
+                            datetime.fromisoformat(snapshot["v"]),
+                            next_fire.date(),
+                            next_fire,
+                            schedule_id,
+                        )
+                        for (msg_id, _, next_fire, snapshot), schedule_id in zip(repeats, planned)
+                    ]
+                )
+                result = await session.execute(
+                    update(table)
+                    .where(table.c.id == rows.c.id, table.c.updated_at == rows.c.version)
+                    .values(
+                        start_send_date=rows.c.send_date,
+                        start_fire_at=rows.c.fire_at,
+                        start_schedule_id=rows.c.schedule_id,
+                        updated_at=table.c.updated_at,
+                    )
+                    .returning(table.c.id)
+                )
+                advanced = set(result.scalars())
+            await session.commit()
+        # The next occurrence is only registered for rows that were advanced above.
+        await apply_reschedules(
+            [
+                (None, schedule_id, msg_id, user_id, next_fire, snapshot)
+                for (msg_id, user_id, next_fire, snapshot), schedule_id in zip(repeats, planned)
+                if schedule_id and msg_id in advanced
+            ]
+        )
+    await _push(
+        redis,
+        [(user_id, snapshot["text"]) for _, user_id, _, snapshot in fresh],
+        {user_id for _, user_id, _, snapshot in fresh if snapshot["start"]},
+    )
+    logger.info(f"Delivered {len(fresh)} reminders, skipped {len(fires) - len(fresh)} stale")
+
+
+async def _send(db: DBDependency, redis: RedisDependency, items: List[dict]) -> None:
+    fires = [
+        (UUID(str(item["args"][0])), item["args"][1], item["kwargs"].get("fire_at"))
+        for item in items
+    ]
+    snapshots = [item["kwargs"].get("snapshot") for item in items]
+    delivered = [
+        (*fire, snapshot) for fire, snapshot in zip(fires, snapshots) if snapshot is not None
+    ]
+    legacy = [(fire[0], fire[2]) for fire, snapshot in zip(fires, snapshots) if snapshot is None]
+    if delivered:
+        await _deliver(db, redis, delivered)
+    if legacy:
+        await _dispatch(db, redis, legacy)
+
+
+@timer.dispatcher
+async def dispatch_due(schedules: List[ScheduledTask]) -> None:
+    # Reminders are sent in-process, anything else the timer claimed goes to the broker.
+    items = [
+        {"args": schedule.args, "kwargs": schedule.kwargs}
+        for schedule in schedules
+        if schedule.task_name == SEND_TELEGRAM
+    ]
+    if items:
+        db = DBDependency()
+        try:
+            await _send(db, RedisDependency(), items)
+        finally:
+            await db.close()
+    for schedule in schedules:
+        if schedule.task_name != SEND_TELEGRAM:
+            await AsyncKicker(schedule.task_name, broker, schedule.labels).kiq(
+                *schedule.args, **schedule.kwargs
+            )
+
+
 @broker.task
 async def send_telegram(
     msg_id: UUID,
     user_id: int,
-    db: Annotated[DBDependency, TaskiqDepends(DBDependency)],
+    db: Annotated[DBDependency, TaskiqDepends(get_db)],
     redis: Annotated[RedisDependency, TaskiqDepends(RedisDependency)],
+    fire_at: Optional[str] = None,
+    snapshot: Optional[dict] = None,
 ):
-    async with db.db_session() as session:
-        msg = await session.execute(select(Message).where(Message.id == msg_id))
-        msg = msg.scalar_one_or_none()
-        logger.info(msg.id)
-        if msg:
-            start = False
-            logger.warning("sending msg")
-            if msg.send_start:
-                start = True
-                logger.info("start_message")
+    item = {"args": [msg_id, user_id], "kwargs": {"fire_at": fire_at, "snapshot": snapshot}}
+    await _send(db, redis, [item])
+
+
+@broker.task
+async def send_telegram_batch(
+    items: List[dict],
+    db: Annotated[DBDependency, TaskiqDepends(get_db)],
+    redis: Annotated[RedisDependency, TaskiqDepends(RedisDependency)],
+):
+    await _send(db, redis, items)
+
+
+@broker.task(schedule=[{"cron": settings.scheduler_settings.horizon_refresh_cron}])
+async def load_schedule_horizon(db: Annotated[DBDependency, TaskiqDepends(get_db)]):
+    horizon = horizon_end()
+    batch_size = settings.scheduler_settings.horizon_batch_size
+    snapshot_columns = [getattr(Message, field) for field in SNAPSHOT_FIELDS]
+    loaded = 0
+    for fire_column, id_column in (
+        (Message.start_fire_at, Message.start_schedule_id),
+        (Message.end_fire_at, Message.end_schedule_id),
+    ):
+        while True:
+            async with db.db_session() as session:
+                rows = await session.execute(
+                    select(Message.id, Message.user_id, fire_column, *snapshot_columns)
+                    .where(id_column.is_(None), fire_column <= horizon, Message.is_active)
+                    .order_by(fire_column)
+                    .limit(batch_size)
+                    .with_for_update(skip_locked=True)
+                )
+                rows = rows.all()
+                if not rows:
+                    break
+                start = fire_column is Message.start_fire_at
+                schedule_ids = await schedule_fires(
+                    [
+                        (row.id, row.user_id, row[2], notification_snapshot(row._mapping, start))
+                        for row in rows
+                    ]
+                )
                 await session.execute(
-                    update(Message).where(Message.id == msg_id).values(send_start=False)
+                    update(Message),
+                    [
+                        {"id": row.id, id_column.key: schedule_id, "updated_at": row.updated_at}
+                        for row, schedule_id in zip(rows, schedule_ids)
+                    ],
                 )
                 await session.commit()
-            header = f"<b>{msg.name}</b>\n" if msg.name else ""
-            priority_text = f"Приоритет: {msg.priority}\n"
-            start_text = "Это первое напоминание.\n" if start else ""
-            if msg.payload.get("description"):
-                content = f"Сообщение:\n{msg.payload['description']}\n"
-            else:
-                content = ""
-            if msg.payload.get("array"):
-                content += "Список:\n"
-                for item in msg.payload["array"]:
-                    for key, val in item.items():
-                        indicator = "✅" if val else "❎"
-                        content += f"{key}: {indicator}\n"
-                content += "\n"
-            text = f"{header}Ваше напоминание.\n{priority_text}{content}{start_text}"
-            payld = {
-                "text": text,
-                "user_id": user_id,
-            }
-            async with redis.get_client() as client:
-                await client.publish("telegram_queue", json.dumps(payld))
+            loaded += len(rows)
+            if len(rows) < batch_size:
+                break
+    logger.info(f"Loaded {loaded} schedules up to {horizon.isoformat()}")
+
+
+@broker.task(schedule=[{"cron": settings.scheduler_settings.reconcile_cron}])
+async def reconcile_schedules(dry_run: bool = False) -> dict:
+    return await reconcile(dry_run)
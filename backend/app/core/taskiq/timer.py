@@ -0,0 +1,135 @@
+import asyncio
+from datetime import datetime, timezone
+from time import time
+from typing import Awaitable, Callable, List, Optional, Set
+from uuid import uuid4
+
+from app.core.logging.logging import get_logger
+from app.core.metrics import TIMER_LATENESS
+from app.core.settings import settings
+from app.core.taskiq.schedule_source import ZSetScheduleSource
+from app.utils.timer_wheel import TimerWheel
+from taskiq import ScheduledTask
+
+logger = get_logger()
+
+Dispatcher = Callable[[List[ScheduledTask]], Awaitable[None]]
+
+
+# Runs in the worker: the lease holder claims entries due within the lookahead every
+# prefetch interval, keeps them in a timer wheel and hands them to the dispatcher as they
+# come due, without going through the scheduler and the broker. Entries the scheduler
+# pops first are sent the usual way, a claim never races it because both are atomic.
+#
+# On a crash the claimed entries stay in Redis. Whoever takes the lease next, after it
+# expires, puts them back in the due set and claims them again, so late ones fire at once.
+# Entries are handed off to a sending set right before they are dispatched, so a new
+# holder never requeues one that is being sent. A dispatch is cut off after
+# timer_send_timeout and its entries go back to the due set. Entries left in the sending set
+# for twice that long, by a holder that crashed mid-send, are put back by the lease holder.
+class ReminderTimer:
+    def __init__(self, source: ZSetScheduleSource) -> None:
+        self._source = source
+        self._dispatch: Optional[Dispatcher] = None
+        self._token = uuid4().hex
+        self._wheel: Optional[TimerWheel] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+        self._sending: Set[asyncio.Task] = set()
+
+    def dispatcher(self, func: Dispatcher) -> Dispatcher:
+        self._dispatch = func
+        return func
+
+    async def start(self) -> None:
+        if self._dispatch is None:
+            logger.warning("Reminder timer has no dispatcher, not started")
+            return
+        if self._task is None or self._task.done():
+            self._running = True
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._running = False
+        if self._task is None:
+            return
+        await self._task
+        self._task = None
+        if self._sending:
+            await asyncio.gather(*self._sending, return_exceptions=True)
+        # Entries still waiting in the wheel go back to the due set for the next holder.
+        requeued = await self._source.release_lease(self._token)
+        self._wheel = None
+        if requeued:
+            logger.info(f"Reminder timer released {requeued} claimed schedules")
+
+    async def _run(self) -> None:
+        scheduler_settings = settings.scheduler_settings
+        next_prefetch = 0.0
+        while self._running:
+            now = time()
+            if now >= next_prefetch:
+                next_prefetch = now + scheduler_settings.timer_prefetch_interval
+                try:
+                    await self._prefetch(now)
+                except Exception as e:
+                    logger.error(f"Reminder timer prefetch failed: {e}")
+            if self._wheel is not None:
+                due = self._wheel.advance(time())
+                if due:
+                    self._fire(due)
+            await asyncio.sleep(scheduler_settings.timer_tick)
+
+    async def _prefetch(self, now: float) -> None:
+        scheduler_settings = settings.scheduler_settings
+        held = await self._source.acquire_lease(
+            self._token,
+            scheduler_settings.timer_lease_ttl,
+            now - 2 * scheduler_settings.timer_send_timeout,
+        )
+        if not held:
+            if self._wheel is not None:
+                logger.warning("Reminder timer lost its lease")
+                self._wheel = None
+                # Sends already handed off finish here, everything else is the new holder's.
+                if self._sending:
+                    await asyncio.gather(*self._sending, return_exceptions=True)
+            return
+        if held == 2 or self._wheel is None:
+            # A fresh lease means earlier claims are back in the due set, the wheel starts over.
+            logger.info("Reminder timer acquired the lease")
+            self._wheel = TimerWheel(scheduler_settings.timer_tick, now)
+        until = datetime.fromtimestamp(now + scheduler_settings.timer_lookahead, timezone.utc)
+        for schedule in await self._source.claim(until, self._token):
+            self._wheel.add(ZSetScheduleSource._score(schedule), schedule)
+
+    def _fire(self, schedules: List[ScheduledTask]) -> None:
+        now = time()
+        for schedule in schedules:
+            TIMER_LATENESS.observe(now - ZSetScheduleSource._score(schedule))
+        batch_size = settings.scheduler_settings.dispatch_batch_size
+        for offset in range(0, len(schedules), batch_size):
+            task = asyncio.create_task(self._send(schedules[offset : offset + batch_size]))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _send(self, schedules: List[ScheduledTask]) -> None:
+        schedule_ids = await self._source.hand_off([schedule.schedule_id for schedule in schedules])
+        if len(schedule_ids) < len(schedules):
+            logger.warning(
+                f"Reminder timer skipped {len(schedules) - len(schedule_ids)} schedules "
+                "that are no longer claimed"
+            )
+            handed_off = set(schedule_ids)
+            schedules = [schedule for schedule in schedules if schedule.schedule_id in handed_off]
+        if not schedules:
+            return
+        try:
+            await asyncio.wait_for(
+                self._dispatch(schedules), settings.scheduler_settings.timer_send_timeout
+            )
+        except Exception as e:
+            logger.error(f"Reminder timer dispatch failed: {e!r}")
+            await self._source.unclaim(schedule_ids)
+            return
+        await self._source.delete_schedules(schedule_ids)
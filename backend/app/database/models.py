@@ -1,21 +1,25 @@
-from datetime import date, time
+from datetime import date, datetime, time
 from typing import List, Optional
 from uuid import UUID
 
 import inflect
 from app.database.mixins.id_mixins import IDMixin
-from app.database.mixins.timestamp_mixins import TimestampsMixin
+from app.database.mixins.timestamp_mixins import CreatedAtMixin, TimestampsMixin
 from app.database.utils import MsgType
 from sqlalchemy import (
     ARRAY,
     BigInteger,
     Boolean,
     Date,
+    DateTime,
     Enum,
+    Index,
     Integer,
     String,
+    Text,
     Time,
     Uuid,
+    text,
 )
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, declarative_base, declared_attr, mapped_column
@@ -42,7 +46,7 @@ class User(TimestampsMixin, Base):
 class Message(IDMixin, TimestampsMixin, Base):
     user_id: Mapped[int] = mapped_column(BigInteger)
     name: Mapped[str] = mapped_column(String, nullable=True)
-    payload: Mapped[dict] = mapped_column(JSONB, nullable=True)
+    payload: Mapped[dict] = mapped_column(JSONB(none_as_null=True), nullable=True)
     start_send_date: Mapped[Optional[date]] = mapped_column(Date(), nullable=False)
     type: Mapped[MsgType] = mapped_column(Enum(MsgType), default=MsgType.ALARM)
     start_send_time: Mapped[time] = mapped_column(Time(timezone=True), nullable=True)
@@ -52,8 +56,37 @@ class Message(IDMixin, TimestampsMixin, Base):
     notification: Mapped[bool] = mapped_column(Boolean, default=True)
     send_start: Mapped[bool] = mapped_column(Boolean, default=True)
     send_end: Mapped[bool] = mapped_column(Boolean, default=False)
-    start_schedule_id: Mapped[UUID] = mapped_column(Uuid(as_uuid=True))
-    end_schedule_id: Mapped[UUID] = mapped_column(Uuid(as_uuid=True), nullable=True)
+    start_fire_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    end_fire_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    start_schedule_id: Mapped[Optional[UUID]] = mapped_column(Uuid(as_uuid=True), nullable=True)
+    end_schedule_id: Mapped[Optional[UUID]] = mapped_column(Uuid(as_uuid=True), nullable=True)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     repeat: Mapped[bool] = mapped_column(Boolean, default=False)
     repeat_wd: Mapped[Optional[List[int]]] = mapped_column(ARRAY(Integer), nullable=True)
+    repeat_rule: Mapped[Optional[dict]] = mapped_column(JSONB(none_as_null=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_messages_user_start_date", "user_id", "start_send_date", "id"),
+        Index(
+            "ix_messages_start_fire_at_unscheduled",
+            "start_fire_at",
+            postgresql_where=text("start_schedule_id IS NULL"),
+        ),
+        Index(
+            "ix_messages_end_fire_at_unscheduled",
+            "end_fire_at",
+            postgresql_where=text("end_schedule_id IS NULL"),
+        ),
+    )
+
+
+class Outbox(CreatedAtMixin, Base):
+    # Written in the same transaction as the message change, OutboxRelay applies the
+    # schedule changes and publishes the event after commit.
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(BigInteger)
+    fires: Mapped[Optional[list]] = mapped_column(JSONB(none_as_null=True), nullable=True)
+    forget: Mapped[Optional[List[UUID]]] = mapped_column(ARRAY(Uuid(as_uuid=True)), nullable=True)
+    event: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
@@ -0,0 +1,58 @@
+from app.core.logging.logging import get_logger
+from app.database.models import Message
+from app.database.utils import fire_at_expression
+from sqlalchemy import func, inspect, select, text, update
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.schema import CreateIndex
+
+logger = get_logger()
+
+# Serializes startup DDL across processes, create_all and the upgrade are not safe to run
+# concurrently.
+SCHEMA_LOCK = 7_253_111
+
+# create_all only creates missing tables. These bring a messages table created by an older
+# release up to date, and every step is a no-op once applied.
+ADDED_COLUMNS = ("repeat_rule", "start_fire_at", "end_fire_at")
+NULLABLE_COLUMNS = ("start_schedule_id",)
+
+
+def _columns(sync_conn, table_name: str) -> dict:
+    return {column["name"]: column for column in inspect(sync_conn).get_columns(table_name)}
+
+
+async def upgrade_schema(conn: AsyncConnection) -> None:
+    table = Message.__table__
+    columns = await conn.run_sync(_columns, table.name)
+    added = [name for name in ADDED_COLUMNS if name not in columns]
+    for name in added:
+        column_type = table.c[name].type.compile(conn.dialect)
+        await conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {name} {column_type}"))
+    for name in NULLABLE_COLUMNS:
+        if not columns[name]["nullable"]:
+            await conn.execute(text(f"ALTER TABLE {table.name} ALTER COLUMN {name} DROP NOT NULL"))
+    for index in table.indexes:
+        await conn.execute(CreateIndex(index, if_not_exists=True))
+    # Older rows get their fire times from the send date and time, in the same transaction
+    # as the new columns, so the horizon loader and the reconciler see them.
+    for kind in ("start", "end"):
+        if f"{kind}_fire_at" not in added:
+            continue
+        send_date = table.c[f"{kind}_send_date"]
+        result = await conn.execute(
+            update(table)
+            .where(send_date.is_not(None))
+            .values(
+                {
+                    f"{kind}_fire_at": fire_at_expression(send_date, table.c[f"{kind}_send_time"]),
+                    "updated_at": table.c.updated_at,
+                }
+            )
+        )
+        logger.info(f"Backfilled {kind}_fire_at for {result.rowcount} messages")
+    if added:
+        logger.info(f"Added columns to {table.name}: {', '.join(added)}")
+
+
+async def lock_schema(conn: AsyncConnection) -> None:
+    await conn.execute(select(func.pg_advisory_xact_lock(SCHEMA_LOCK)))
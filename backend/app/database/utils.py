@@ -1,5 +1,8 @@
+from datetime import time
 from enum import Enum
 
+from sqlalchemy import DateTime, Time, cast, func, literal
+
 
 class MsgType(Enum):
     ALARM = "ALARM"
@@ -7,3 +10,13 @@ class MsgType(Enum):
     EVENT_LONG = "EVENT_LONG"
     ARRAY = "ARRAY"
     TASK = "TASK"
+
+
+# SQL counterpart of scheduling.fire_datetime: the time's own offset is dropped and the
+# result is UTC.
+def fire_at_expression(send_date, send_time):
+    return func.timezone(
+        "UTC",
+        send_date + func.coalesce(cast(send_time, Time()), literal(time(), Time())),
+        type_=DateTime(timezone=True),
+    )
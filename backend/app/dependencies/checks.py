@@ -1,11 +1,15 @@
-from typing import Annotated
+from hmac import compare_digest
+from time import time
+from typing import Annotated, Optional
 
 from app.api.auth.schemas import TokensTuple
 from app.core.logging.logging import get_logger
+from app.core.settings import settings
 from app.dependencies.redis_dependency import RedisDependency
 from app.utils.cookies import get_tokens_cookies
+from app.utils.token_cache import token_cache, token_digest
 from app.utils.token_manager import TokenManager
-from fastapi import Depends
+from fastapi import Depends, Header
 from fastapi.exceptions import HTTPException
 
 logger = get_logger()
@@ -15,12 +19,41 @@ async def check_user_token(
     tokens: Annotated[TokensTuple, Depends(get_tokens_cookies)],
     redis: Annotated[RedisDependency, Depends(RedisDependency)],
 ) -> int:
+    digest = token_digest(tokens.access_token)
+    user_id = token_cache.get(digest)
+    if user_id is not None:
+        return user_id
+    generation = token_cache.generation
     async with redis.get_client() as client:
-        user_id = await client.get(f"access_token:{tokens.access_token}")
-    if not user_id:
+        user_id, ttl_ms, revoked = (
+            await client.pipeline(transaction=False)
+            .get(f"access_token:{tokens.access_token}")
+            .pttl(f"access_token:{tokens.access_token}")
+            .exists(f"revoked_token:{digest}")
+            .execute()
+        )
+    if revoked:
+        raise HTTPException(401, "Token has been revoked")
+    if user_id:
+        expires_at = time() + ttl_ms / 1000
+    else:
         data = TokenManager.decode_token(tokens.access_token)
         user_id = data.get("sub")
         if not user_id:
             logger.error("No user for this token")
             raise HTTPException(401, "No user for this token")
+        expires_at = data["exp"]
+    token_cache.set(digest, int(user_id), expires_at, generation)
     return int(user_id)
+
+
+# Operational endpoints answer 404 unless the caller presents the internal token, so they
+# look absent from the internet even if a proxy rule is missing.
+async def check_internal_token(x_internal_token: Optional[str] = Header(None)) -> None:
+    token = settings.metrics_settings.internal_token
+    if (
+        token is None
+        or x_internal_token is None
+        or not compare_digest(x_internal_token.encode(), token.get_secret_value().encode())
+    ):
+        raise HTTPException(404, "Not found")
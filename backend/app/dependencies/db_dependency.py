@@ -1,31 +1,102 @@
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+from typing import Optional
+
 from app.core.logging.logging import get_logger
+from app.core.metrics import instrument_engine
 from app.core.settings import settings
 from app.database.models import Base
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from app.database.upgrades import lock_schema, upgrade_schema
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 
 logger = get_logger()
 
 
 class DBDependency:
+    _engine: Optional[AsyncEngine] = None
+    _session_factory: Optional[async_sessionmaker[AsyncSession]] = None
+
     def __init__(self) -> None:
-        self._engine = create_async_engine(
-            url=settings.db_settings.db_url, echo=settings.db_settings.db_echo
-        )
-        self._session_factory = async_sessionmaker(
-            bind=self._engine, expire_on_commit=False, autocommit=False
-        )
+        self._session: Optional[AsyncSession] = None
+
+    @classmethod
+    def init_engine(cls) -> AsyncEngine:
+        if cls._engine is None:
+            db_settings = settings.db_settings
+            cls._engine = create_async_engine(
+                url=db_settings.db_url,
+                echo=db_settings.db_echo,
+                pool_size=db_settings.db_pool_size,
+                max_overflow=db_settings.db_max_overflow,
+                pool_timeout=db_settings.db_pool_timeout,
+                pool_recycle=db_settings.db_pool_recycle,
+                pool_pre_ping=db_settings.db_pool_pre_ping,
+            )
+            instrument_engine(cls._engine)
+            cls._session_factory = async_sessionmaker(
+                bind=cls._engine, expire_on_commit=False, autocommit=False
+            )
+            logger.info("Database engine created")
+        return cls._engine
+
+    @classmethod
+    async def dispose_engine(cls) -> None:
+        if cls._engine is not None:
+            await cls._engine.dispose()
+            cls._engine = None
+            cls._session_factory = None
+            logger.info("Database engine disposed")
+
+    @classmethod
+    def pool_stats(cls) -> dict:
+        if cls._engine is None:
+            return {}
+        pool = cls._engine.pool
+        return {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "max_overflow": settings.db_settings.db_max_overflow,
+        }
 
     @property
-    def db_session(self) -> async_sessionmaker[AsyncSession]:
-        return self._session_factory
+    def engine(self) -> AsyncEngine:
+        return self.init_engine()
+
+    @asynccontextmanager
+    async def db_session(self) -> AsyncGenerator[AsyncSession, None]:
+        if self._session is None:
+            self.init_engine()
+            self._session = self._session_factory()
+        try:
+            yield self._session
+        except Exception:
+            await self._session.rollback()
+            raise
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
 
     @classmethod
     async def initialize_tables(cls) -> None:
-        logger.info(settings.db_settings.db_url)
         logger.info("Tables are created or exists")
-        engine = create_async_engine(
-            url=settings.db_settings.db_url, echo=settings.db_settings.db_echo
-        )
-        async with engine.begin() as conn:
+        async with cls.init_engine().begin() as conn:
+            await lock_schema(conn)
             await conn.run_sync(Base.metadata.create_all)
-        await engine.dispose()
+            await upgrade_schema(conn)
+
+
+async def get_db() -> AsyncGenerator[DBDependency, None]:
+    db = DBDependency()
+    try:
+        yield db
+    finally:
+        await db.close()
@@ -1,22 +1,82 @@
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
+from time import perf_counter
+from typing import Optional
 
+from app.core.metrics import REDIS_COMMAND_DURATION
 from app.core.settings import settings
-from redis.asyncio import ConnectionPool, Redis
+from redis.asyncio import BlockingConnectionPool, Redis
+from redis.asyncio.client import Pipeline
+
+
+class InstrumentedPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        start = perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            REDIS_COMMAND_DURATION.labels("PIPELINE").observe(perf_counter() - start)
+
+
+class InstrumentedRedis(Redis):
+    async def execute_command(self, *args, **options):
+        start = perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            REDIS_COMMAND_DURATION.labels(str(args[0]).upper()).observe(perf_counter() - start)
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> Pipeline:
+        return InstrumentedPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
 
 
 class RedisDependency:
-    def __init__(self) -> None:
-        self._url = settings.redis_settings.redis_url
-        self._pool: ConnectionPool = self._init_pool()
+    _pool: Optional[BlockingConnectionPool] = None
+
+    @classmethod
+    def init_pool(cls) -> BlockingConnectionPool:
+        if cls._pool is None:
+            redis_settings = settings.redis_settings
+            cls._pool = BlockingConnectionPool.from_url(
+                url=redis_settings.redis_url,
+                encoding="utf-8",
+                decode_responses=True,
+                max_connections=redis_settings.redis_max_connections,
+                timeout=redis_settings.redis_pool_timeout,
+                health_check_interval=redis_settings.redis_health_check_interval,
+                socket_keepalive=True,
+            )
+        return cls._pool
 
-    def _init_pool(self) -> ConnectionPool:
-        return ConnectionPool.from_url(url=self._url, encoding="utf-8", decode_responses=True)
+    @classmethod
+    async def close_pool(cls) -> None:
+        if cls._pool is not None:
+            await cls._pool.aclose()
+            cls._pool = None
+
+    @classmethod
+    def pool_stats(cls) -> dict:
+        if cls._pool is None:
+            return {}
+        return {
+            "max_connections": cls._pool.max_connections,
+            "idle": len(cls._pool._available_connections),
+            "in_use": len(cls._pool._in_use_connections),
+        }
 
     @asynccontextmanager
-    async def get_client(self) -> AsyncGenerator:
-        redis_client = Redis(connection_pool=self._pool)
+    async def get_client(self) -> AsyncGenerator[Redis, None]:
+        redis_client = InstrumentedRedis(connection_pool=self.init_pool())
         try:
             yield redis_client
         finally:
             await redis_client.aclose()
+
+    @asynccontextmanager
+    async def pipeline(self, transaction: bool = False) -> AsyncGenerator[Pipeline, None]:
+        async with self.get_client() as client:
+            async with client.pipeline(transaction=transaction) as pipe:
+                yield pipe
+                await pipe.execute()
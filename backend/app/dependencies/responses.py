@@ -1,13 +1,31 @@
-from fastapi.responses import JSONResponse, Response
+from typing import Optional
+
+from fastapi.responses import ORJSONResponse, Response
 
 
 def badresponse(message: str = "Server error", code: int = 400):
-    return JSONResponse(content={"message": message, "status": "error"}, status_code=code)
+    return ORJSONResponse(content={"message": message, "status": "error"}, status_code=code)
 
 
 def okresponse(message: str = "success", code: int = 200):
-    return JSONResponse(content={"message": message, "status": "success"}, status_code=code)
+    return ORJSONResponse(content={"message": message, "status": "success"}, status_code=code)
 
 
 def emptyresponse(code: int = 204):
     return Response(status_code=code)
+
+
+# Per-user data, so shared caches must not store it, and clients always revalidate.
+REVALIDATE = "private, no-cache"
+
+
+def etagresponse(content, etag: str, headers: Optional[dict] = None):
+    return Response(
+        content=content,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": REVALIDATE, **(headers or {})},
+    )
+
+
+def notmodifiedresponse(etag: str):
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": REVALIDATE})
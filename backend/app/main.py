@@ -2,21 +2,38 @@ from contextlib import asynccontextmanager
 
 from app.core.logging.log_middleware import LoggingMiddleware
 from app.core.logging.logging import setup_logging
+from app.core.metrics import MetricsMiddleware, mark_process_dead, start_metrics_server
+from app.core.outbox.relay import relay
+from app.core.pubsub.hub import hub
 from app.core.routers_loader import include_all_routers
 from app.core.settings import settings
 from app.core.taskiq.broker import broker
 from app.dependencies.db_dependency import DBDependency
+from app.dependencies.redis_dependency import RedisDependency
+from app.utils.token_cache import REVOKED_CHANNEL, token_cache
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
+from fastapi.responses import ORJSONResponse, RedirectResponse
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    DBDependency.init_engine()
+    RedisDependency.init_pool()
     await DBDependency.initialize_tables()
+    start_metrics_server(settings.metrics_settings.api_metrics_port)
+    await hub.add_listener(REVOKED_CHANNEL, token_cache.revoke)
     if not broker.is_worker_process:
         await broker.startup()
+    await relay.start()
     yield
+    await relay.stop()
+    if not broker.is_worker_process:
+        await broker.shutdown()
+    await hub.close()
+    await DBDependency.dispose_engine()
+    await RedisDependency.close_pool()
+    mark_process_dead()
 
 
 def create_app() -> FastAPI:
@@ -27,11 +44,13 @@ def create_app() -> FastAPI:
         docs_url="/docs",
         redoc_url="/redoc",
         lifespan=lifespan,
+        default_response_class=ORJSONResponse,
         swagger_ui_parameters={"withCredentials": True},
     )
 
     include_all_routers(app)
     app.add_middleware(LoggingMiddleware)
+    app.add_middleware(MetricsMiddleware)
 
     app.add_middleware(
         CORSMiddleware,
@@ -39,6 +58,7 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor"],
     )
 
     return app
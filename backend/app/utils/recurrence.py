@@ -0,0 +1,69 @@
+from calendar import monthrange
+from datetime import datetime, timedelta
+from typing import Optional, Sequence
+
+# repeat_wd follows the mini-app convention: 0 is Sunday, 6 is Saturday.
+MAX_STEPS = 10000
+
+
+def js_weekday(value: datetime) -> int:
+    return (value.weekday() + 1) % 7
+
+
+def add_months(value: datetime, months: int, day: int) -> datetime:
+    month_index = value.month - 1 + months
+    year, month = value.year + month_index // 12, month_index % 12 + 1
+    return value.replace(year=year, month=month, day=min(day, monthrange(year, month)[1]))
+
+
+def _step(current: datetime, repeat_wd: Optional[Sequence[int]], rule: dict) -> datetime:
+    freq = rule.get("freq", "weekly")
+    interval = rule.get("interval") or 1
+    if freq == "daily":
+        return current + timedelta(days=interval)
+    if freq == "monthly":
+        return add_months(current, interval, rule.get("monthday") or current.day)
+    weekdays = {day for day in repeat_wd or () if 0 <= day <= 6}
+    if not weekdays:
+        return current + timedelta(weeks=interval)
+    candidate = current
+    while True:
+        candidate += timedelta(days=1)
+        if js_weekday(candidate) == 0:
+            candidate += timedelta(weeks=interval - 1)
+        if js_weekday(candidate) in weekdays:
+            return candidate
+
+
+def next_occurrence(
+    current: datetime,
+    repeat_wd: Optional[Sequence[int]] = None,
+    rule: Optional[dict] = None,
+    after: Optional[datetime] = None,
+) -> Optional[datetime]:
+    if not rule and not repeat_wd:
+        return None
+    rule = rule or {}
+    until = rule.get("until")
+    if isinstance(until, str):
+        until = datetime.fromisoformat(until).date()
+    after = max(current, after) if after else current
+    candidate = current
+    for _ in range(MAX_STEPS):
+        candidate = _step(candidate, repeat_wd, rule)
+        if until and candidate.date() > until:
+            return None
+        if candidate > after:
+            return candidate
+    return None
+
+
+def first_occurrence(
+    start: datetime,
+    repeat_wd: Optional[Sequence[int]] = None,
+    rule: Optional[dict] = None,
+) -> datetime:
+    freq = (rule or {}).get("freq")
+    if repeat_wd and js_weekday(start) not in repeat_wd and freq in (None, "weekly"):
+        return next_occurrence(start, repeat_wd, rule) or start
+    return start
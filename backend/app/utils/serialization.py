@@ -0,0 +1,43 @@
+from typing import Any, Union
+from uuid import UUID
+
+import orjson
+from pydantic import BaseModel, TypeAdapter
+
+_any_adapter = TypeAdapter(Any)
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    # asyncpg returns its own UUID subclass, which orjson does not treat as a UUID.
+    if isinstance(value, UUID):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(value: Any) -> bytes:
+    return orjson.dumps(value, default=_default)
+
+
+def dumps_str(value: Any) -> str:
+    return orjson.dumps(value, default=_default).decode()
+
+
+# orjson rejects timezone-aware times, so payloads that carry models go through pydantic-core.
+def dumps_models(value: Any, **kwargs: Any) -> bytes:
+    return _any_adapter.dump_json(value, **kwargs)
+
+
+def loads(value: Union[bytes, str]) -> Any:
+    return orjson.loads(value)
+
+
+# Frames are built once per published event and the same bytes go to every subscriber.
+def sse_frame(data: Union[bytes, str]) -> bytes:
+    if isinstance(data, str):
+        data = data.encode()
+    return b"data: " + data + b"\n\n"
+
+
+SSE_PING = b": ping\n\n"
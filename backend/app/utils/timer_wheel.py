@@ -0,0 +1,66 @@
+from math import ceil
+from typing import Any, List
+
+
+# Hierarchical timing wheel. Level 0 has `slots` slots of `tick` seconds each, and every
+# level above covers `slots` times the span of the one below. An entry sits at the lowest
+# level whose current block also holds its deadline and moves down a level whenever the
+# wheel enters its slot, so adding is O(1) and advancing is O(1) per tick plus the entries
+# that move or expire. Deadlines are rounded up to a whole tick, entries never fire early.
+class TimerWheel:
+    def __init__(self, tick: float, now: float, slots: int = 64, levels: int = 4) -> None:
+        self.tick = tick
+        self._slots = slots
+        self._levels = levels
+        self._wheels: List[List[List[Any]]] = [[[] for _ in range(slots)] for _ in range(levels)]
+        self._overflow: List[tuple] = []
+        self._expired: List[Any] = []
+        self._current = int(now / tick)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, deadline: float, item: Any) -> None:
+        self._size += 1
+        self._place(ceil(deadline / self.tick), item)
+
+    def _place(self, deadline_tick: int, item: Any) -> None:
+        if deadline_tick <= self._current:
+            self._expired.append(item)
+            return
+        span = 1
+        for level in range(self._levels):
+            if deadline_tick // (span * self._slots) == self._current // (span * self._slots):
+                self._wheels[level][deadline_tick // span % self._slots].append(
+                    (deadline_tick, item)
+                )
+                return
+            span *= self._slots
+        self._overflow.append((deadline_tick, item))
+
+    def _cascade(self, level: int, index: int) -> None:
+        entries = self._wheels[level][index]
+        self._wheels[level][index] = []
+        for deadline_tick, item in entries:
+            self._place(deadline_tick, item)
+
+    def advance(self, now: float) -> List[Any]:
+        target = int(now / self.tick)
+        if self._size == len(self._expired):
+            self._current = max(self._current, target)
+        while self._current < target:
+            self._current += 1
+            current = self._current
+            if current % self._slots**self._levels == 0:
+                overflow, self._overflow = self._overflow, []
+                for deadline_tick, item in overflow:
+                    self._place(deadline_tick, item)
+            for level in range(self._levels - 1, 0, -1):
+                span = self._slots**level
+                if current % span == 0:
+                    self._cascade(level, current // span % self._slots)
+            self._cascade(0, current % self._slots)
+        expired, self._expired = self._expired, []
+        self._size -= len(expired)
+        return expired
@@ -0,0 +1,68 @@
+from collections import OrderedDict
+from hashlib import sha256
+from time import time
+from typing import Optional, Tuple
+
+from app.core.settings import settings
+
+REVOKED_CHANNEL = "access_token:revoked"
+
+
+def token_digest(token: str) -> str:
+    return sha256(token.encode()).hexdigest()
+
+
+class TokenCache:
+    def __init__(self, maxsize: int, ttl: int) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[str, Tuple[int, float]] = OrderedDict()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, digest: str) -> Optional[int]:
+        entry = self._entries.get(digest)
+        if entry is None:
+            self.misses += 1
+            return None
+        user_id, expires_at = entry
+        if expires_at <= time():
+            del self._entries[digest]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(digest)
+        self.hits += 1
+        return user_id
+
+    def set(self, digest: str, user_id: int, expires_at: float, generation: int) -> None:
+        # A revocation that lands while the caller was verifying may be for this very token.
+        if generation != self.generation:
+            return
+        self._entries[digest] = (user_id, min(expires_at, time() + self.ttl))
+        self._entries.move_to_end(digest)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def revoke(self, digest: str) -> None:
+        self.generation += 1
+        self._entries.pop(digest, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0,
+            "evictions": self.evictions,
+            "revocations": self.generation,
+        }
+
+
+token_cache = TokenCache(
+    settings.jwt_settings.token_cache_size, settings.jwt_settings.token_cache_ttl
+)
@@ -0,0 +1,367 @@
+"""Load benchmark for the REST API, driven in-process through httpx's ASGI transport.
+
+    python -m benchmarks.api_load --users 100 --messages 50 --requests 2000 --output api.json
+
+Postgres comes from the usual DB_* settings and should be a local, disposable database.
+Redis is an in-memory fakeredis server unless --real-redis is passed, in which case the
+REDIS_* settings are used. Benchmark users get ids from --user-id-base upwards, and they
+and their messages are deleted at the end unless --keep is passed. Reminders are dated a
+year ahead, so none of them reach the schedule source's horizon.
+
+The scenarios are create, list by month, get, profile, update, delete, login, refresh and
+SSE fan-out. The revalidate_* scenarios repeat list by month, get and profile with the ETag
+of the previous response for the same user and URL in If-None-Match, and also report how
+many came back 304 and the body bytes received. Fan-out subscribes --sse-clients streams
+through the message-stream generator and measures request-to-delivery latency for each
+frame, which includes the outbox relay.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import random
+import statistics
+from collections import Counter
+from datetime import date, timedelta
+from time import perf_counter, time
+from urllib.parse import quote
+
+import httpx
+from app.api.user.routers.message_stream import event_generator
+from app.core.outbox.relay import relay
+from app.core.pubsub.hub import hub
+from app.core.settings import settings
+from app.core.taskiq import scheduling
+from app.core.taskiq.schedule_source import ZSetScheduleSource
+from app.database.models import Message, User
+from app.database.utils import MsgType
+from app.dependencies.db_dependency import DBDependency
+from app.dependencies.redis_dependency import RedisDependency
+from app.main import app
+from app.utils.token_manager import TokenManager
+from redis.asyncio import BlockingConnectionPool
+from sqlalchemy import delete, insert
+from uuid_v7.base import uuid7
+
+YEAR = date.today().year + 1
+
+
+def summarize(samples: list, errors: int, seconds: float) -> dict:
+    samples = sorted(samples)
+    if not samples:
+        return {"requests": 0, "errors": errors}
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "throughput_rps": round(len(samples) / seconds, 1),
+        "p50_ms": round(statistics.median(samples) * 1000, 3),
+        "p95_ms": round(samples[max(int(len(samples) * 0.95) - 1, 0)] * 1000, 3),
+        "p99_ms": round(samples[max(int(len(samples) * 0.99) - 1, 0)] * 1000, 3),
+    }
+
+
+def use_fake_redis() -> None:
+    import fakeredis
+    from fakeredis import FakeAsyncConnection
+
+    server = fakeredis.FakeServer()
+    url = settings.redis_settings.redis_url
+    RedisDependency._pool = BlockingConnectionPool.from_url(
+        url,
+        connection_class=FakeAsyncConnection,
+        server=server,
+        decode_responses=True,
+        max_connections=settings.redis_settings.redis_max_connections,
+    )
+    scheduling.source = ZSetScheduleSource(url, connection_class=FakeAsyncConnection, server=server)
+
+
+def init_data(user_id: int) -> str:
+    fields = {
+        "auth_date": str(int(time())),
+        "user": json.dumps({"id": user_id, "first_name": "bench"}, separators=(",", ":")),
+    }
+    check = "\n".join(f"{key}={value}" for key, value in sorted(fields.items()))
+    secret = hmac.new(
+        b"WebAppData", settings.bot_token.get_secret_value().encode(), hashlib.sha256
+    ).digest()
+    fields["hash"] = hmac.new(secret, check.encode(), hashlib.sha256).hexdigest()
+    return "&".join(f"{key}={quote(value)}" for key, value in fields.items())
+
+
+def random_day() -> date:
+    return date(YEAR, 1, 1) + timedelta(days=random.randint(0, 364))
+
+
+def message_body() -> dict:
+    return {
+        "name": "bench",
+        "payload": {"description": "benchmark reminder"},
+        "start_send_date": random_day().isoformat(),
+        "start_send_time": "09:00:00+00:00",
+        "type": random.choice(list(MsgType)).value,
+        "priority": random.randint(0, 3),
+    }
+
+
+class Bench:
+    def __init__(self, args) -> None:
+        self.args = args
+        self.user_ids = [args.user_id_base + i for i in range(args.users)]
+        self.cookies = {}
+        self.messages = {user_id: [] for user_id in self.user_ids}
+        self.etags = {}
+        self.revalidated = Counter()
+        self.client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app), base_url="http://bench/api"
+        )
+
+    async def seed(self) -> None:
+        engine = DBDependency.init_engine()
+        await DBDependency.initialize_tables()
+        async with engine.begin() as conn:
+            await conn.execute(delete(Message).where(Message.user_id.in_(self.user_ids)))
+            await conn.execute(delete(User).where(User.id.in_(self.user_ids)))
+            await conn.execute(
+                insert(User),
+                [
+                    {"id": user_id, "name": "bench", "username": f"bench{user_id}"}
+                    for user_id in self.user_ids
+                ],
+            )
+            rows = []
+            for user_id in self.user_ids:
+                for _ in range(self.args.messages):
+                    msg_id = uuid7()
+                    self.messages[user_id].append(str(msg_id))
+                    rows.append(
+                        {
+                            "id": msg_id,
+                            "user_id": user_id,
+                            "name": "seed",
+                            "payload": {"description": "seed"},
+                            "start_send_date": random_day(),
+                            "priority": 1,
+                        }
+                    )
+            for offset in range(0, len(rows), 5000):
+                await conn.execute(insert(Message), rows[offset : offset + 5000])
+        async with RedisDependency().get_client() as client:
+            for user_id in self.user_ids:
+                access = TokenManager.create_token({"sub": str(user_id)})
+                refresh = TokenManager.create_token({"sub": str(user_id)}, False)
+                await client.setex(
+                    f"access_token:{access}",
+                    settings.jwt_settings.access_token_expire_min * 60,
+                    user_id,
+                )
+                self.cookies[user_id] = {"access_token": access, "refresh_token": refresh}
+
+    async def cleanup(self) -> None:
+        async with DBDependency.init_engine().begin() as conn:
+            await conn.execute(delete(Message).where(Message.user_id.in_(self.user_ids)))
+            await conn.execute(delete(User).where(User.id.in_(self.user_ids)))
+
+    async def drive(self, make_request) -> dict:
+        samples = []
+        errors = 0
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+
+        async def one(i: int) -> None:
+            nonlocal errors
+            async with semaphore:
+                start = perf_counter()
+                response = await make_request(i)
+                elapsed = perf_counter() - start
+                if response.status_code >= 400:
+                    errors += 1
+                else:
+                    samples.append(elapsed)
+
+        start = perf_counter()
+        await asyncio.gather(*(one(i) for i in range(self.args.requests)))
+        return summarize(samples, errors, perf_counter() - start)
+
+    def pick(self):
+        user_id = random.choice(self.user_ids)
+        return user_id, self.cookies[user_id]
+
+    async def create(self, i: int) -> httpx.Response:
+        user_id, cookies = self.pick()
+        response = await self.client.post("/message", json=message_body(), cookies=cookies)
+        if response.status_code == 200:
+            self.messages[user_id].append(response.json()["id"])
+        return response
+
+    async def list_month(self, i: int) -> httpx.Response:
+        user_id, cookies = self.pick()
+        month = random.randint(1, 12)
+        start = date(YEAR, month, 1)
+        end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        return await self.client.get(
+            "/message",
+            params={"start_date": start.isoformat(), "end_date": end.isoformat()},
+            cookies=cookies,
+        )
+
+    async def get(self, i: int) -> httpx.Response:
+        user_id, cookies = self.pick()
+        msg_id = random.choice(self.messages[user_id])
+        return await self.client.get(f"/message/{msg_id}", cookies=cookies)
+
+    async def profile(self, i: int) -> httpx.Response:
+        _, cookies = self.pick()
+        return await self.client.get("/profile", cookies=cookies)
+
+    async def conditional(self, user_id: int, url: str, params: dict = None) -> httpx.Response:
+        key = (user_id, url, tuple(sorted((params or {}).items())))
+        headers = {"If-None-Match": self.etags[key]} if key in self.etags else None
+        response = await self.client.get(
+            url, params=params, headers=headers, cookies=self.cookies[user_id]
+        )
+        if "etag" in response.headers:
+            self.etags[key] = response.headers["etag"]
+        self.revalidated["not_modified"] += response.status_code == 304
+        self.revalidated["bytes"] += len(response.content)
+        return response
+
+    async def revalidate_list(self, i: int) -> httpx.Response:
+        user_id, _ = self.pick()
+        start = date(YEAR, random.randint(1, 12), 1)
+        end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        return await self.conditional(
+            user_id, "/message", {"start_date": start.isoformat(), "end_date": end.isoformat()}
+        )
+
+    async def revalidate_get(self, i: int) -> httpx.Response:
+        user_id, _ = self.pick()
+        return await self.conditional(user_id, f"/message/{random.choice(self.messages[user_id])}")
+
+    async def revalidate_profile(self, i: int) -> httpx.Response:
+        user_id, _ = self.pick()
+        return await self.conditional(user_id, "/profile")
+
+    async def update(self, i: int) -> httpx.Response:
+        user_id, cookies = self.pick()
+        msg_id = random.choice(self.messages[user_id])
+        return await self.client.patch(
+            f"/message/{msg_id}",
+            json={"name": f"updated {i}", "priority": random.randint(0, 3)},
+            cookies=cookies,
+        )
+
+    async def delete(self, i: int) -> httpx.Response:
+        user_id, cookies = self.pick()
+        while not self.messages[user_id]:
+            user_id, cookies = self.pick()
+        msg_id = self.messages[user_id].pop()
+        return await self.client.delete(f"/message/{msg_id}", cookies=cookies)
+
+    async def login(self, i: int) -> httpx.Response:
+        user_id, _ = self.pick()
+        return await self.client.post("/login", data={"initData": init_data(user_id)})
+
+    async def refresh(self, i: int) -> httpx.Response:
+        _, cookies = self.pick()
+        return await self.client.get("/refresh", cookies=cookies)
+
+    async def sse_fanout(self) -> dict:
+        user_id = self.user_ids[0]
+        streams = [event_generator(user_id) for _ in range(self.args.sse_clients)]
+        # The first __anext__ subscribes and then waits for a frame, so start them as tasks.
+        pending = [asyncio.ensure_future(stream.__anext__()) for stream in streams]
+        await asyncio.sleep(0.2)
+        samples = []
+        start = perf_counter()
+        for i in range(self.args.sse_events):
+            published = perf_counter()
+            await self.client.post("/message", json=message_body(), cookies=self.cookies[user_id])
+            for index, stream in enumerate(streams):
+                await pending[index]
+                samples.append(perf_counter() - published)
+                pending[index] = asyncio.ensure_future(stream.__anext__())
+        seconds = perf_counter() - start
+        # Cancelling the pending reads runs each generator's finally, which unsubscribes.
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        result = summarize(samples, 0, seconds)
+        result["clients"] = self.args.sse_clients
+        result["events"] = self.args.sse_events
+        return result
+
+    async def run(self) -> dict:
+        results = {}
+        for name in (
+            "create",
+            "list_month",
+            "get",
+            "profile",
+            "revalidate_list",
+            "revalidate_get",
+            "revalidate_profile",
+            "update",
+            "delete",
+            "login",
+            "refresh",
+        ):
+            if self.args.only and name not in self.args.only:
+                continue
+            self.revalidated.clear()
+            results[name] = await self.drive(getattr(self, name))
+            if name.startswith("revalidate_"):
+                results[name].update(self.revalidated)
+            print(f"{name}: {json.dumps(results[name])}")
+        if not self.args.only or "sse_fanout" in self.args.only:
+            results["sse_fanout"] = await self.sse_fanout()
+            print(f"sse_fanout: {json.dumps(results['sse_fanout'])}")
+        return results
+
+
+async def main(args) -> None:
+    random.seed(args.seed)
+    if not args.real_redis:
+        use_fake_redis()
+    bench = Bench(args)
+    await bench.seed()
+    # The ASGI transport does not run the lifespan, so the relay is started here.
+    await relay.start()
+    try:
+        results = await bench.run()
+    finally:
+        if not args.keep:
+            await bench.cleanup()
+        await relay.stop()
+        await bench.client.aclose()
+        await hub.close()
+        await DBDependency.dispose_engine()
+    output = json.dumps(
+        {
+            "config": {key: value for key, value in vars(args).items() if key not in ("output",)},
+            "results": results,
+        },
+        indent=2,
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2_000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--sse-clients", type=int, default=100)
+    parser.add_argument("--sse-events", type=int, default=50)
+    parser.add_argument("--user-id-base", type=int, default=9_000_000_000)
+    parser.add_argument("--real-redis", action="store_true")
+    parser.add_argument("--only", nargs="*", default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true")
+    parser.add_argument("--output", default=None)
+    asyncio.run(main(parser.parse_args()))
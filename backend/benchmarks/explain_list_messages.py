@@ -0,0 +1,131 @@
+"""Check that list_messages is served by ix_messages_user_start_date.
+
+    python -m benchmarks.explain_list_messages --rows 200000 --users 1000
+
+Seeds --rows messages for --users users inside a transaction, runs ANALYZE and
+EXPLAIN on the range and keyset queries built by MessageService, prints the plans
+and exits non-zero if either of them falls back to a sequential scan. The
+transaction is rolled back, so nothing is left behind.
+
+With --upgraded the check runs in a scratch schema holding a messages table as an
+older release created it, without the fire-time columns and indexes, brought up to
+date by the startup upgrade instead of create_all.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+from datetime import date, timedelta
+
+from app.api.user.services import MessageService
+from app.api.user.utils import encode_cursor
+from app.database.models import Base, Message
+from app.database.upgrades import ADDED_COLUMNS, NULLABLE_COLUMNS, upgrade_schema
+from app.dependencies.db_dependency import DBDependency
+from sqlalchemy import insert, text
+from sqlalchemy.schema import DropIndex
+from uuid_v7.base import uuid7
+
+INDEX = "ix_messages_user_start_date"
+SCRATCH_SCHEMA = "explain_upgrade"
+
+
+def make_rows(count: int, users: int) -> list:
+    today = date.today()
+    rows = []
+    for _ in range(count):
+        start = today + timedelta(days=random.randint(-365, 365))
+        rows.append(
+            {
+                "id": uuid7(),
+                "user_id": random.randint(1, users),
+                "start_send_date": start,
+                "end_send_date": start + timedelta(days=random.randint(0, 3)),
+                "priority": 0,
+            }
+        )
+    return rows
+
+
+def index_nodes(plan: dict):
+    if plan.get("Index Name"):
+        yield plan["Node Type"], plan["Index Name"]
+    for child in plan.get("Plans", []):
+        yield from index_nodes(child)
+
+
+async def create_upgraded(conn) -> None:
+    await conn.execute(text(f"CREATE SCHEMA {SCRATCH_SCHEMA}"))
+    await conn.execute(text(f"SET LOCAL search_path TO {SCRATCH_SCHEMA}"))
+    await conn.run_sync(Base.metadata.create_all)
+    table = Message.__table__
+    for index in table.indexes:
+        await conn.execute(DropIndex(index, if_exists=True))
+    for name in ADDED_COLUMNS:
+        await conn.execute(text(f"ALTER TABLE {table.name} DROP COLUMN {name}"))
+    for name in NULLABLE_COLUMNS:
+        await conn.execute(text(f"ALTER TABLE {table.name} ALTER COLUMN {name} SET NOT NULL"))
+    await upgrade_schema(conn)
+
+
+async def explain(conn, query) -> dict:
+    compiled = query.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True})
+    result = await conn.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}"))
+    plan = result.scalar_one()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+
+async def main(args) -> int:
+    engine = DBDependency.init_engine()
+    failed = False
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        try:
+            if args.upgraded:
+                await create_upgraded(conn)
+            else:
+                await conn.run_sync(Base.metadata.create_all)
+            rows = make_rows(args.rows, args.users)
+            for offset in range(0, len(rows), args.chunk):
+                await conn.execute(insert(Message), rows[offset : offset + args.chunk])
+            await conn.execute(text("ANALYZE messages"))
+
+            start = date.today()
+            queries = {
+                "range": MessageService.list_messages_query(
+                    args.user_id, start, start + timedelta(days=args.days)
+                ),
+                "keyset": MessageService.list_messages_query(
+                    args.user_id,
+                    start,
+                    start + timedelta(days=args.days),
+                    limit=50,
+                    cursor=encode_cursor(start, uuid7()),
+                ),
+            }
+            for name, query in queries.items():
+                plan = await explain(conn, query)
+                nodes = list(index_nodes(plan))
+                print(f"{name}: {json.dumps(plan, indent=2)}")
+                if not any(index == INDEX for _, index in nodes):
+                    print(f"{name}: {INDEX} is not used", file=sys.stderr)
+                    failed = True
+        finally:
+            await transaction.rollback()
+    await DBDependency.dispose_engine()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--user-id", type=int, default=1)
+    parser.add_argument("--days", type=int, default=31)
+    parser.add_argument("--chunk", type=int, default=5_000)
+    parser.add_argument("--upgraded", action="store_true")
+    sys.exit(asyncio.run(main(parser.parse_args())))
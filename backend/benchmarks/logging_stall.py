@@ -0,0 +1,125 @@
+"""Measure event-loop stalls caused by logging a burst of records.
+
+    python -m benchmarks.logging_stall --records 10000 --output logging.json
+
+"direct" reproduces the previous setup, with a RotatingFileHandler and a coloured
+stream handler on the root logger. "queue" is setup_logging(), which only enqueues
+records on the loop. A probe coroutine sleeps for --tick-ms in a loop, and every
+wake-up later than that counts as a stall while the burst is logged. Log files go
+to a temporary directory and console output goes to /dev/null.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from time import perf_counter
+
+
+def setup_direct(log_dir: Path) -> None:
+    from app.core.logging.logging import LOG_FORMAT
+    from colorlog import ColoredFormatter
+
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.handlers.clear()
+    file_handler = RotatingFileHandler(
+        log_dir / "app.log", maxBytes=5 * 1024 * 1024, backupCount=5, encoding="utf-8"
+    )
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(ColoredFormatter("%(log_color)s" + LOG_FORMAT))
+    root.addHandler(file_handler)
+    root.addHandler(console_handler)
+
+
+def teardown_direct() -> None:
+    root = logging.getLogger()
+    for handler in root.handlers:
+        handler.close()
+    root.handlers.clear()
+
+
+async def probe(tick: float, lags: list, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        start = perf_counter()
+        await asyncio.sleep(tick)
+        lags.append(perf_counter() - start - tick)
+
+
+async def burst(records: int, chunk: int) -> float:
+    logger = logging.getLogger("benchmarks.logging_stall")
+    start = perf_counter()
+    for offset in range(0, records, chunk):
+        for i in range(offset, min(offset + chunk, records)):
+            logger.info("reminder %s scheduled for user %s", i, i % 1000)
+        await asyncio.sleep(0)
+    return perf_counter() - start
+
+
+async def run(args) -> dict:
+    lags: list = []
+    stop = asyncio.Event()
+    prober = asyncio.create_task(probe(args.tick_ms / 1000, lags, stop))
+    await asyncio.sleep(args.tick_ms / 1000 * 5)
+    lags.clear()
+    loop_seconds = await burst(args.records, args.chunk)
+    stop.set()
+    await prober
+    lags.sort()
+    return {
+        "records": args.records,
+        "loop_ms": round(loop_seconds * 1000, 2),
+        "stall_max_ms": round(lags[-1] * 1000, 3) if lags else 0,
+        "stall_p99_ms": round(lags[int(len(lags) * 0.99) - 1] * 1000, 3) if lags else 0,
+        "stall_median_ms": round(statistics.median(lags) * 1000, 3) if lags else 0,
+    }
+
+
+def main(args) -> None:
+    results = []
+    stdout = sys.stdout
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull:
+        os.chdir(tmp)
+        from app.core.logging.logging import LOG_DIR, setup_logging, stop_logging
+
+        for mode in ("direct", "queue"):
+            if args.only and args.only != mode:
+                continue
+            sys.stdout = devnull
+            try:
+                if mode == "direct":
+                    setup_direct(LOG_DIR)
+                else:
+                    setup_logging()
+                result = asyncio.run(run(args))
+                if mode == "direct":
+                    teardown_direct()
+                else:
+                    flush_start = perf_counter()
+                    stop_logging()
+                    result["drain_ms"] = round((perf_counter() - flush_start) * 1000, 2)
+            finally:
+                sys.stdout = stdout
+            results.append({"mode": mode, **result})
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=10_000)
+    parser.add_argument("--chunk", type=int, default=100)
+    parser.add_argument("--tick-ms", type=float, default=1.0)
+    parser.add_argument("--only", choices=["direct", "queue"], default=None)
+    parser.add_argument("--output", default=None)
+    main(parser.parse_args())
@@ -0,0 +1,146 @@
+"""Compare the ORM and the column-projected read paths of list_messages.
+
+    python -m benchmarks.message_read --messages 500 --rounds 200 --output read.json
+
+Seeds --messages reminders for one user inside a single month in a transaction that
+is rolled back at the end, then runs the month query built by
+MessageService.list_messages_query both ways, bypassing the Redis range cache:
+
+- orm: full Message entities through an AsyncSession, validated into MessageScheme
+  with from_attributes and dumped with TypeAdapter.
+- projected: only the MessageScheme columns, rows dumped as dicts.
+
+Both report end-to-end time from executing the query to the JSON body, and the
+share spent after the rows arrived.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+from datetime import date, time, timedelta, timezone
+from time import perf_counter
+
+from app.api.user.services import (
+    MessageService,
+    message_list_adapter,
+    message_rows_adapter,
+)
+from app.database.models import Base, Message
+from app.database.utils import MsgType
+from app.dependencies.db_dependency import DBDependency
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from uuid_v7.base import uuid7
+
+MONTH = date(2030, 3, 1)
+
+
+def make_rows(count: int, user_id: int) -> list:
+    return [
+        {
+            "id": uuid7(),
+            "user_id": user_id,
+            "name": f"reminder {i}",
+            "payload": {
+                "description": "x" * random.randint(10, 200),
+                "array": [{f"item {j}": bool(j % 2)} for j in range(random.randint(0, 6))],
+            },
+            "start_send_date": MONTH + timedelta(days=i % 31),
+            "start_send_time": time(9, 30, tzinfo=timezone.utc),
+            "type": random.choice(list(MsgType)),
+            "priority": random.randint(0, 3),
+            "repeat": i % 5 == 0,
+            "repeat_wd": [1, 3, 5] if i % 5 == 0 else None,
+            "repeat_rule": {"freq": "weekly", "interval": 1} if i % 5 == 0 else None,
+        }
+        for i in range(count)
+    ]
+
+
+def summarize(total: list, encode: list, size: int) -> dict:
+    total.sort()
+    return {
+        "bytes": size,
+        "median_ms": round(statistics.median(total) * 1000, 3),
+        "p95_ms": round(total[int(len(total) * 0.95) - 1] * 1000, 3),
+        "encode_median_ms": round(statistics.median(encode) * 1000, 3),
+    }
+
+
+async def orm_path(session: AsyncSession, query) -> tuple:
+    start = perf_counter()
+    result = await session.execute(query)
+    messages = result.scalars().all()
+    fetched = perf_counter()
+    body = message_list_adapter.dump_json(
+        message_list_adapter.validate_python(messages, from_attributes=True)
+    )
+    # The identity map would otherwise keep the entities and skip hydration next round.
+    session.expunge_all()
+    end = perf_counter()
+    return body, end - start, end - fetched
+
+
+async def projected_path(session: AsyncSession, query) -> tuple:
+    start = perf_counter()
+    result = await session.execute(query)
+    rows = result.all()
+    fetched = perf_counter()
+    body = message_rows_adapter.dump_json([row._asdict() for row in rows])
+    end = perf_counter()
+    return body, end - start, end - fetched
+
+
+async def main(args) -> None:
+    random.seed(args.seed)
+    engine = DBDependency.init_engine()
+    results = {}
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        try:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(insert(Message), make_rows(args.messages, args.user_id))
+            session = AsyncSession(bind=conn)
+            end = MONTH + timedelta(days=30)
+            paths = {
+                "orm": (orm_path, MessageService.list_messages_query(args.user_id, MONTH, end)),
+                "projected": (
+                    projected_path,
+                    MessageService.list_messages_query(args.user_id, MONTH, end, projected=True),
+                ),
+            }
+            for name, (path, query) in paths.items():
+                for _ in range(args.warmup):
+                    await path(session, query)
+                total, encode = [], []
+                for _ in range(args.rounds):
+                    body, elapsed, encoding = await path(session, query)
+                    total.append(elapsed)
+                    encode.append(encoding)
+                results[name] = summarize(total, encode, len(body))
+                print(f"{name}: {json.dumps(results[name])}")
+            await session.close()
+        finally:
+            await transaction.rollback()
+    await DBDependency.dispose_engine()
+    output = json.dumps(
+        {"config": {k: v for k, v in vars(args).items() if k != "output"}, "results": results},
+        indent=2,
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--user-id", type=int, default=9_100_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None)
+    asyncio.run(main(parser.parse_args()))
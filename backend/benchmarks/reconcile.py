@@ -0,0 +1,161 @@
+"""Throughput of schedule reconciliation against a large messages table.
+
+    python -m benchmarks.reconcile --messages 1000000 --output reconcile.json
+
+Postgres comes from the usual DB_* settings and must be a local, disposable database: the
+reconciler walks the whole messages table, not only the rows seeded here. Rows are
+generated server-side with generate_series for --users users from --user-id-base upwards,
+each with a start fire within the next day, and deleted at the end unless --keep is passed.
+Redis is an in-memory fakeredis server unless --real-redis is passed.
+
+The runs are, in order:
+- "dry_run": the diff against an empty source, as after a Redis flush.
+- "rebuild": restores every entry.
+- "verify": a second pass with nothing to do.
+- "repair": runs after --drop of the entries are deleted and --orphans unreferenced ones
+  are added.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
+from uuid import uuid4
+
+from app.core.settings import settings
+from app.core.taskiq import scheduling
+from app.core.taskiq.broker import SEND_TELEGRAM
+from app.core.taskiq.reconcile import Reconciler
+from app.database.models import Message
+from app.database.utils import MsgType
+from app.dependencies.db_dependency import DBDependency
+from app.dependencies.redis_dependency import RedisDependency
+from benchmarks.api_load import use_fake_redis
+from sqlalchemy import (
+    Date,
+    DateTime,
+    Interval,
+    cast,
+    delete,
+    func,
+    insert,
+    literal,
+    select,
+)
+from taskiq import ScheduledTask
+
+
+async def seed(args) -> float:
+    now = datetime.now(timezone.utc)
+    series = func.generate_series(1, args.messages).table_valued("i").render_derived()
+    fire_at = literal(now, DateTime(timezone=True)) + (series.c.i % 86_000 + 60) * literal(
+        timedelta(seconds=1), Interval()
+    )
+    columns = {
+        "id": func.gen_random_uuid(),
+        "user_id": args.user_id_base + series.c.i % args.users,
+        "name": literal("bench"),
+        "payload": func.jsonb_build_object("description", "benchmark reminder"),
+        "start_send_date": cast(fire_at, Date()),
+        "start_fire_at": fire_at,
+        "start_schedule_id": func.gen_random_uuid(),
+        "type": literal(MsgType.ALARM, Message.__table__.c.type.type),
+        "priority": series.c.i % 4,
+        "notification": literal(True),
+        "send_start": literal(True),
+        "send_end": literal(False),
+        "is_active": literal(True),
+        "repeat": literal(False),
+        "created_at": literal(now, DateTime(timezone=True)),
+        "updated_at": literal(now, DateTime(timezone=True)),
+    }
+    start = perf_counter()
+    async with DBDependency.init_engine().begin() as conn:
+        await conn.execute(insert(Message).from_select(list(columns), select(*columns.values())))
+    return perf_counter() - start
+
+
+async def cleanup(args) -> None:
+    async with DBDependency.init_engine().begin() as conn:
+        await conn.execute(
+            delete(Message).where(
+                Message.user_id.between(args.user_id_base, args.user_id_base + args.users)
+            )
+        )
+
+
+async def damage(args) -> None:
+    source = scheduling.source
+    dropped = []
+    async for entries in source.scan_entries(10_000):
+        dropped.extend(schedule_id for schedule_id, _ in entries if random.random() < args.drop)
+    await source.delete_schedules(dropped)
+    fire_at = datetime.now(timezone.utc) + timedelta(hours=1)
+    orphans = [
+        ScheduledTask(
+            task_name=SEND_TELEGRAM,
+            labels={},
+            args=[str(uuid4()), args.user_id_base],
+            kwargs={"fire_at": fire_at.isoformat()},
+            schedule_id=uuid4().hex,
+            time=fire_at,
+        )
+        for _ in range(args.orphans)
+    ]
+    if orphans:
+        await source.add_schedules(orphans)
+
+
+async def main(args) -> None:
+    random.seed(args.seed)
+    if not args.real_redis:
+        use_fake_redis()
+    scheduler_settings = settings.scheduler_settings
+    scheduler_settings.reconcile_batch_size = args.batch_size
+    scheduler_settings.reconcile_concurrency = args.concurrency
+    scheduler_settings.reconcile_orphan_grace = args.grace
+    await DBDependency.initialize_tables()
+    results = {"seed_seconds": round(await seed(args), 3)}
+    print(f"seeded {args.messages} rows in {results['seed_seconds']} s")
+    try:
+        for name in ("dry_run", "rebuild", "verify", "repair"):
+            if name == "repair":
+                await damage(args)
+            stats = await Reconciler(name == "dry_run", scheduling.source).run()
+            results[name] = stats
+            print(f"{name}: {json.dumps(stats)}")
+    finally:
+        if not args.keep:
+            await cleanup(args)
+        await DBDependency.dispose_engine()
+        await RedisDependency.close_pool()
+    output = json.dumps(
+        {
+            "config": {key: value for key, value in vars(args).items() if key != "output"},
+            "results": results,
+        },
+        indent=2,
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--user-id-base", type=int, default=9_100_000_000)
+    parser.add_argument("--batch-size", type=int, default=5_000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--drop", type=float, default=0.1)
+    parser.add_argument("--orphans", type=int, default=1_000)
+    parser.add_argument("--grace", type=float, default=1.0)
+    parser.add_argument("--real-redis", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true")
+    parser.add_argument("--output", default=None)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,154 @@
+"""Compare ListRedisScheduleSource with ZSetScheduleSource on a live Redis.
+
+    python -m benchmarks.schedule_source --count 1000000 --output zset.json
+
+Both sources get --count one-off schedules spread over the next 24 hours, then
+--reschedules random entries are moved and --due entries are made due and pulled
+with a single get_schedules() call. Keys are written under bench-only prefixes and
+removed afterwards.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
+from uuid import uuid4
+
+from app.core.settings import settings
+from app.core.taskiq.schedule_source import ZSetScheduleSource
+from redis.asyncio import Redis
+from taskiq import ScheduledTask
+from taskiq_redis import ListRedisScheduleSource
+
+
+def make_schedule(fire_at: datetime) -> ScheduledTask:
+    return ScheduledTask(
+        task_name="app.core.taskiq.tasks:send_telegram",
+        labels={},
+        args=[str(uuid4()), random.randint(1, 10**9)],
+        kwargs={},
+        schedule_id=uuid4().hex,
+        time=fire_at,
+    )
+
+
+def percentiles(samples: list) -> dict:
+    samples = sorted(samples)
+    return {
+        "p50_ms": round(statistics.median(samples) * 1000, 3),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1] * 1000, 3),
+        "p99_ms": round(samples[int(len(samples) * 0.99) - 1] * 1000, 3),
+    }
+
+
+async def gather_limited(coros, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(coro):
+        async with semaphore:
+            return await coro
+
+    return await asyncio.gather(*(run(coro) for coro in coros))
+
+
+async def timed(coro):
+    start = perf_counter()
+    await coro
+    return perf_counter() - start
+
+
+async def reschedule_list(source, old: ScheduledTask, new: ScheduledTask):
+    await source.delete_schedule(old.schedule_id)
+    await source.add_schedule(new)
+
+
+async def bench(name: str, source, redis: Redis, args) -> dict:
+    now = datetime.now(timezone.utc)
+    memory_before = (await redis.info("memory"))["used_memory"]
+    schedules = [
+        make_schedule(now + timedelta(seconds=random.randint(600, 86400)))
+        for _ in range(args.count)
+    ]
+
+    start = perf_counter()
+    for offset in range(0, len(schedules), args.chunk):
+        chunk = schedules[offset : offset + args.chunk]
+        if isinstance(source, ZSetScheduleSource):
+            await source.add_schedules(chunk)
+        else:
+            await gather_limited(
+                (source.add_schedule(schedule) for schedule in chunk), args.concurrency
+            )
+    add_seconds = perf_counter() - start
+    memory_after = (await redis.info("memory"))["used_memory"]
+
+    moved = random.sample(schedules, args.reschedules)
+    replacements = [
+        make_schedule(now + timedelta(seconds=random.randint(600, 86400))) for _ in moved
+    ]
+    if isinstance(source, ZSetScheduleSource):
+        calls = (source.reschedule(old.schedule_id, new) for old, new in zip(moved, replacements))
+    else:
+        calls = (reschedule_list(source, old, new) for old, new in zip(moved, replacements))
+    reschedule_samples = await gather_limited((timed(call) for call in calls), args.concurrency)
+
+    due = [make_schedule(now - timedelta(seconds=1)) for _ in range(args.due)]
+    await gather_limited((source.add_schedule(schedule) for schedule in due), args.concurrency)
+    start = perf_counter()
+    fetched = await source.get_schedules()
+    fetch_seconds = perf_counter() - start
+
+    return {
+        "source": name,
+        "count": args.count,
+        "add_per_second": round(args.count / add_seconds),
+        "memory_mb": round((memory_after - memory_before) / 1024 / 1024, 2),
+        "reschedule": percentiles(reschedule_samples),
+        "due_fetched": len(fetched),
+        "due_fetch_ms": round(fetch_seconds * 1000, 3),
+    }
+
+
+async def cleanup(redis: Redis, prefix: str):
+    async for key in redis.scan_iter(f"{prefix}:*", count=10000):
+        await redis.unlink(key)
+
+
+async def main(args):
+    url = args.url or settings.redis_settings.redis_url
+    redis = Redis.from_url(url)
+    results = []
+    for name, prefix, source in (
+        ("list", "bench_list", ListRedisScheduleSource(url, prefix="bench_list")),
+        ("zset", "bench_zset", ZSetScheduleSource(url, prefix="bench_zset")),
+    ):
+        if args.only and args.only != name:
+            continue
+        await source.startup()
+        try:
+            results.append(await bench(name, source, redis, args))
+        finally:
+            await source.shutdown()
+            await cleanup(redis, prefix)
+    await redis.aclose()
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default=None)
+    parser.add_argument("--count", type=int, default=1_000_000)
+    parser.add_argument("--reschedules", type=int, default=10_000)
+    parser.add_argument("--due", type=int, default=10_000)
+    parser.add_argument("--chunk", type=int, default=5_000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--only", choices=["list", "zset"], default=None)
+    parser.add_argument("--output", default=None)
+    asyncio.run(main(parser.parse_args()))
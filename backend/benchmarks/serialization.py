@@ -0,0 +1,128 @@
+"""Microbenchmark for response and SSE encoding of a 500-message month.
+
+    python -m benchmarks.serialization --messages 500 --subscribers 100 --output serialization.json
+
+Messages are built as detached ORM rows, no database is needed. The response encoders
+compared are:
+
+- jsonable_encoder: FastAPI's fallback for a List[MessageScheme] with JSONResponse.
+- orjson_response: the response_model path with ORJSONResponse, i.e. pydantic-core to
+  JSON-compatible Python followed by orjson.
+- adapter_dump_json: the list endpoint's direct TypeAdapter.dump_json.
+
+The SSE case encodes one messages_updated event for --subscribers clients, once per
+client with json.dumps(default=str) as before, and once shared as bytes.
+"""
+
+import argparse
+import json
+import random
+import statistics
+from datetime import date, datetime, time, timedelta, timezone
+from time import perf_counter
+from typing import List
+from uuid import uuid4
+
+from app.api.user.schemas import MessageScheme
+from app.database.models import Message
+from app.database.utils import MsgType
+from app.utils.serialization import dumps_models, sse_frame
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+
+adapter = TypeAdapter(List[MessageScheme])
+
+
+def make_messages(count: int) -> list:
+    start = date(2026, 3, 1)
+    return [
+        Message(
+            id=uuid4(),
+            user_id=1,
+            name=f"reminder {i}",
+            payload={
+                "description": "x" * random.randint(10, 200),
+                "array": [{f"item {j}": bool(j % 2)} for j in range(random.randint(0, 6))],
+            },
+            start_send_date=start + timedelta(days=i % 31),
+            start_send_time=time(9, 30, tzinfo=timezone.utc),
+            end_send_date=None,
+            end_send_time=None,
+            type=random.choice(list(MsgType)),
+            priority=random.randint(0, 3),
+            notification=True,
+            repeat=bool(i % 5 == 0),
+            repeat_wd=[1, 3, 5] if i % 5 == 0 else None,
+            repeat_rule={"freq": "weekly", "interval": 1} if i % 5 == 0 else None,
+            created_at=datetime.now(timezone.utc),
+        )
+        for i in range(count)
+    ]
+
+
+def measure(func, rounds: int) -> dict:
+    samples = []
+    size = len(func())
+    for _ in range(rounds):
+        start = perf_counter()
+        func()
+        samples.append(perf_counter() - start)
+    samples.sort()
+    return {
+        "bytes": size,
+        "median_ms": round(statistics.median(samples) * 1000, 3),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1] * 1000, 3),
+    }
+
+
+def main(args) -> None:
+    random.seed(args.seed)
+    rows = make_messages(args.messages)
+    models = adapter.validate_python(rows, from_attributes=True)
+    event = {"event": "messages_updated", "items": models[: args.event_items]}
+    event_json = json.loads(dumps_models(event))
+
+    def per_client():
+        return b"".join(
+            f"data: {json.dumps(event_json, default=str)}\n\n".encode()
+            for _ in range(args.subscribers)
+        )
+
+    def shared():
+        frame = sse_frame(dumps_models(event))
+        return b"".join(frame for _ in range(args.subscribers))
+
+    cases = {
+        "jsonable_encoder": lambda: JSONResponse(jsonable_encoder(models)).body,
+        "orjson_response": lambda: ORJSONResponse(adapter.dump_python(models, mode="json")).body,
+        "adapter_dump_json": lambda: adapter.dump_json(models),
+        "sse_per_client": per_client,
+        "sse_shared": shared,
+    }
+    results = {}
+    for name, func in cases.items():
+        if args.only and name not in args.only:
+            continue
+        results[name] = measure(func, args.rounds)
+        print(f"{name}: {json.dumps(results[name])}")
+    output = json.dumps(
+        {"config": {k: v for k, v in vars(args).items() if k != "output"}, "results": results},
+        indent=2,
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--subscribers", type=int, default=100)
+    parser.add_argument("--event-items", type=int, default=20)
+    parser.add_argument("--only", nargs="*", default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None)
+    main(parser.parse_args())
@@ -0,0 +1,151 @@
+"""Compare reminder firing lateness of the polling scheduler and the worker timer wheel.
+
+    python -m benchmarks.timer_wheel --reminders 5000 --spread 20 --output timer.json
+
+Reminders are spread evenly over --spread seconds, starting --lead seconds from now, in a
+fakeredis schedule source. The lead leaves time for the timer's first claim, which in steady
+state happens minutes before anything is due.
+
+"poll" pops due entries every --update-interval seconds, like `taskiq scheduler`. It only
+measures the pop, the broker hop to a worker comes on top of that. "timer" runs
+ReminderTimer with a dispatcher that records when each reminder would be sent. "restart"
+is the timer mode with the first timer killed, without releasing anything, after
+--crash-at seconds. A second timer takes over once the lease expires. Every mode reports
+lateness percentiles and counts missing and duplicate firings.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+from collections import Counter
+from datetime import datetime, timezone
+from time import time
+from uuid import uuid4
+
+from app.core.settings import settings
+from app.core.taskiq.broker import SEND_TELEGRAM
+from app.core.taskiq.schedule_source import ZSetScheduleSource
+from app.core.taskiq.timer import ReminderTimer
+from taskiq import ScheduledTask
+
+
+def make_source() -> ZSetScheduleSource:
+    import fakeredis
+    from fakeredis import FakeAsyncConnection
+
+    return ZSetScheduleSource(
+        settings.redis_settings.redis_url,
+        prefix=f"bench:{uuid4().hex}",
+        connection_class=FakeAsyncConnection,
+        server=fakeredis.FakeServer(),
+    )
+
+
+async def populate(source: ZSetScheduleSource, reminders: int, spread: float, lead: float) -> float:
+    start = time() + lead
+    schedules = [
+        ScheduledTask(
+            task_name=SEND_TELEGRAM,
+            labels={},
+            args=[str(uuid4()), i],
+            kwargs={},
+            schedule_id=uuid4().hex,
+            time=datetime.fromtimestamp(start + spread * i / reminders, timezone.utc),
+        )
+        for i in range(reminders)
+    ]
+    for offset in range(0, len(schedules), 1000):
+        await source.add_schedules(schedules[offset : offset + 1000])
+    return start + spread
+
+
+def summarize(lateness: list, fired: Counter, reminders: int) -> dict:
+    lateness = sorted(lateness)
+    return {
+        "fired": sum(fired.values()),
+        "missing": reminders - len(fired),
+        "duplicates": sum(count - 1 for count in fired.values() if count > 1),
+        "p50_ms": round(statistics.median(lateness) * 1000, 2),
+        "p95_ms": round(lateness[int(len(lateness) * 0.95) - 1] * 1000, 2),
+        "p99_ms": round(lateness[int(len(lateness) * 0.99) - 1] * 1000, 2),
+        "max_ms": round(lateness[-1] * 1000, 2),
+    }
+
+
+async def run_poll(args) -> dict:
+    source = make_source()
+    end = await populate(source, args.reminders, args.spread, args.lead)
+    lateness, fired = [], Counter()
+    while time() < end + args.update_interval * 2:
+        for schedule in await source.get_schedules():
+            now = time()
+            lateness.append(now - schedule.time.timestamp())
+            fired[schedule.schedule_id] += 1
+            await source.post_send(schedule)
+        await asyncio.sleep(args.update_interval)
+    await source.shutdown()
+    return summarize(lateness, fired, args.reminders)
+
+
+async def run_timer(args, crash: bool) -> dict:
+    source = make_source()
+    end = await populate(source, args.reminders, args.spread, args.lead)
+    lateness, fired = [], Counter()
+
+    async def record(schedules) -> None:
+        now = time()
+        for schedule in schedules:
+            lateness.append(now - schedule.time.timestamp())
+            fired[schedule.schedule_id] += 1
+
+    first = ReminderTimer(source)
+    first.dispatcher(record)
+    await first.start()
+    if crash:
+        await asyncio.sleep(args.crash_at)
+        first._running = False
+        first._task.cancel()
+        second = ReminderTimer(source)
+        second.dispatcher(record)
+        await second.start()
+        first = second
+    await asyncio.sleep(max(end - time(), 0) + 1)
+    await first.stop()
+    await source.shutdown()
+    return summarize(lateness, fired, args.reminders)
+
+
+async def main(args) -> None:
+    scheduler_settings = settings.scheduler_settings
+    scheduler_settings.timer_tick = args.tick
+    scheduler_settings.timer_lease_ttl = args.lease_ttl
+    results = []
+    for mode in ("poll", "timer", "restart"):
+        if args.only and args.only != mode:
+            continue
+        if mode == "poll":
+            result = await run_poll(args)
+        else:
+            result = await run_timer(args, mode == "restart")
+        results.append({"mode": mode, **result})
+        print(json.dumps(results[-1]))
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reminders", type=int, default=5_000)
+    parser.add_argument("--spread", type=float, default=20.0)
+    parser.add_argument("--lead", type=float, default=3.0)
+    parser.add_argument("--update-interval", type=float, default=1.0)
+    parser.add_argument("--tick", type=float, default=settings.scheduler_settings.timer_tick)
+    parser.add_argument("--lease-ttl", type=int, default=3)
+    parser.add_argument("--crash-at", type=float, default=8.0)
+    parser.add_argument("--only", choices=["poll", "timer", "restart"], default=None)
+    parser.add_argument("--output", default=None)
+    asyncio.run(main(parser.parse_args()))
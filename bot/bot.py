@@ -1,12 +1,32 @@
 import asyncio
+import functools
 import json
 import logging
 
 from aiogram import Bot, Dispatcher
+from aiogram.exceptions import TelegramNetworkError, TelegramServerError
 from aiogram.types import BotCommand
-from core.config import BOT_TOKEN, REDIS_URL
+from core.config import (
+    BOT_TOKEN,
+    REDIS_URL,
+    TELEGRAM_BATCH_SIZE,
+    TELEGRAM_BLOCK_MS,
+    TELEGRAM_CHAT_INTERVAL,
+    TELEGRAM_CLAIM_IDLE_MS,
+    TELEGRAM_CLAIM_REFRESH_MS,
+    TELEGRAM_CONCURRENCY,
+    TELEGRAM_CONSUMER,
+    TELEGRAM_GLOBAL_RATE,
+    TELEGRAM_GROUP,
+    TELEGRAM_MAX_PENDING,
+    TELEGRAM_STATS_INTERVAL,
+    TELEGRAM_STREAM,
+    TELEGRAM_TRIM_INTERVAL,
+)
 from core.handlers import router
+from core.sender import TelegramSender
 from redis.asyncio import Redis
+from redis.exceptions import ResponseError
 
 logger = logging.getLogger(__name__)
 dp = Dispatcher()
@@ -14,24 +34,175 @@ dp.include_router(router=router)
 
 bot = Bot(BOT_TOKEN)
 redis = Redis.from_url(REDIS_URL, decode_responses=True)
+sender = TelegramSender(
+    bot,
+    concurrency=TELEGRAM_CONCURRENCY,
+    global_rate=TELEGRAM_GLOBAL_RATE,
+    chat_interval=TELEGRAM_CHAT_INTERVAL,
+    max_pending=TELEGRAM_MAX_PENDING,
+)
+# Entries handed to the sender stay here until acked, so their claim is kept fresh.
+inflight: set[str] = set()
+unacked: set[str] = set()
+background: set[asyncio.Task] = set()
 
 
-async def redis_subscriber():
-    pubsub = redis.pubsub()
-    logger.info("Waiting for redis messages")
-    await pubsub.subscribe("telegram_queue")
+def on_task_done(task: asyncio.Task):
+    background.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Task {task.get_name()} failed: {task.exception()}")
 
-    async for message in pubsub.listen():
-        if message["type"] != "message":
-            continue
-        data = json.loads(message["data"])
-        logger.info(f"Received pubsub message: {data}")
+
+def spawn(coro, name: str) -> asyncio.Task:
+    task = asyncio.create_task(coro, name=name)
+    background.add(task)
+    task.add_done_callback(on_task_done)
+    return task
+
+
+async def ack(entry_id: str):
+    try:
+        await redis.xack(TELEGRAM_STREAM, TELEGRAM_GROUP, entry_id)
+    except Exception as e:
+        # Still claimed by this consumer, keep_claimed retries the ack.
+        unacked.add(entry_id)
+        logger.error(f"Failed to ack {entry_id}: {e}")
+        return
+    inflight.discard(entry_id)
+
+
+async def ensure_consumer_group():
+    try:
+        await redis.xgroup_create(TELEGRAM_STREAM, TELEGRAM_GROUP, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def on_delivered(entry_id: str, future: asyncio.Future):
+    error = future.exception()
+    if isinstance(error, (TelegramNetworkError, TelegramServerError)):
+        # Left pending on purpose, the entry is reclaimed after TELEGRAM_CLAIM_IDLE_MS
+        inflight.discard(entry_id)
+        logger.warning(f"Delivery of {entry_id} postponed: {error}")
+        return
+    if error is not None:
+        logger.error(f"Error while sending message {entry_id}: {error}")
+    spawn(ack(entry_id), f"xack {entry_id}")
+
+
+async def deliver(entry_id: str, fields: dict):
+    if entry_id in inflight:
+        return
+    try:
+        data = json.loads(fields["payload"])
+        chat_id, text = int(data["user_id"]), data["text"]
+    except (KeyError, TypeError, ValueError) as e:
+        logger.error(f"Malformed stream entry {entry_id}: {e}")
+        await redis.xack(TELEGRAM_STREAM, TELEGRAM_GROUP, entry_id)
+        return
+    inflight.add(entry_id)
+    future = await sender.submit(chat_id, text)
+    future.add_done_callback(functools.partial(on_delivered, entry_id))
+
+
+async def reclaim_pending(start_id: str) -> str:
+    next_id, claimed, *_ = await redis.xautoclaim(
+        TELEGRAM_STREAM,
+        TELEGRAM_GROUP,
+        TELEGRAM_CONSUMER,
+        min_idle_time=TELEGRAM_CLAIM_IDLE_MS,
+        start_id=start_id,
+        count=TELEGRAM_BATCH_SIZE,
+    )
+    for entry_id, fields in claimed:
+        if fields:
+            await deliver(entry_id, fields)
+        else:
+            await redis.xack(TELEGRAM_STREAM, TELEGRAM_GROUP, entry_id)
+    return next_id
+
+
+async def keep_claimed():
+    # An entry can wait in the sender longer than TELEGRAM_CLAIM_IDLE_MS, behind a busy chat
+    # or a RetryAfter backoff. Re-claiming it resets its idle time, so no other replica
+    # reclaims and sends it a second time.
+    while True:
+        await asyncio.sleep(TELEGRAM_CLAIM_REFRESH_MS / 1000)
         try:
-            await bot.send_message(
-                chat_id=int(data["user_id"]), text=data["text"], parse_mode="HTML"
+            if unacked:
+                ids = list(unacked)
+                await redis.xack(TELEGRAM_STREAM, TELEGRAM_GROUP, *ids)
+                unacked.difference_update(ids)
+                inflight.difference_update(ids)
+            ids = list(inflight)
+            for offset in range(0, len(ids), TELEGRAM_BATCH_SIZE):
+                await redis.xclaim(
+                    TELEGRAM_STREAM,
+                    TELEGRAM_GROUP,
+                    TELEGRAM_CONSUMER,
+                    0,
+                    ids[offset : offset + TELEGRAM_BATCH_SIZE],
+                    justid=True,
+                )
+        except Exception as e:
+            logger.error(f"Failed to refresh claimed entries: {e}")
+
+
+async def redis_consumer():
+    await ensure_consumer_group()
+    logger.info(f"Consuming {TELEGRAM_STREAM} as {TELEGRAM_GROUP}/{TELEGRAM_CONSUMER}")
+    loop = asyncio.get_running_loop()
+    claim_cursor = "0-0"
+    last_claim = 0.0
+    while True:
+        try:
+            if loop.time() - last_claim >= TELEGRAM_CLAIM_IDLE_MS / 1000:
+                claim_cursor = await reclaim_pending(claim_cursor)
+                if claim_cursor == "0-0":
+                    last_claim = loop.time()
+            response = await redis.xreadgroup(
+                TELEGRAM_GROUP,
+                TELEGRAM_CONSUMER,
+                {TELEGRAM_STREAM: ">"},
+                count=TELEGRAM_BATCH_SIZE,
+                block=TELEGRAM_BLOCK_MS,
             )
+            for _, entries in response:
+                for entry_id, fields in entries:
+                    await deliver(entry_id, fields)
+        except Exception as e:
+            logger.error(f"Stream consumer error: {e}")
+            await asyncio.sleep(1)
+
+
+def stream_id(entry_id: str) -> tuple:
+    return tuple(int(part) for part in entry_id.split("-"))
+
+
+async def trim_acked():
+    # The producer does not cap the stream, entries go only once every group is done with
+    # them: below the oldest pending one, or below the last delivered one if none is pending.
+    while True:
+        await asyncio.sleep(TELEGRAM_TRIM_INTERVAL)
+        try:
+            floors = []
+            for group in await redis.xinfo_groups(TELEGRAM_STREAM):
+                pending = await redis.xpending(TELEGRAM_STREAM, group["name"])
+                floors.append(pending["min"] if pending["pending"] else group["last-delivered-id"])
+            if floors:
+                floor = min(floors, key=stream_id)
+                trimmed = await redis.xtrim(TELEGRAM_STREAM, minid=floor, approximate=True)
+                if trimmed:
+                    logger.info(f"Trimmed {trimmed} acked entries below {floor}")
         except Exception as e:
-            logger.error(f"Error while sending message: {e}")
+            logger.error(f"Failed to trim {TELEGRAM_STREAM}: {e}")
+
+
+async def log_sender_stats():
+    while True:
+        await asyncio.sleep(TELEGRAM_STATS_INTERVAL)
+        logger.info(f"Sender stats: {sender.stats()}")
 
 
 async def main():
@@ -41,7 +212,11 @@ async def main():
         ]
     )
 
-    asyncio.create_task(redis_subscriber())
+    sender.start()
+    spawn(redis_consumer(), "redis_consumer")
+    spawn(keep_claimed(), "keep_claimed")
+    spawn(trim_acked(), "trim_acked")
+    spawn(log_sender_stats(), "log_sender_stats")
 
     try:
         logger.info("Starting bot polling")
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+from collections import deque
+from time import monotonic
+from typing import Deque, Dict, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = monotonic()
+
+    async def acquire(self) -> None:
+        while True:
+            now = monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class ChatState:
+    __slots__ = ("items", "next_at", "scheduled")
+
+    def __init__(self) -> None:
+        self.items: Deque[Tuple[str, asyncio.Future, float]] = deque()
+        self.next_at = 0.0
+        self.scheduled = False
+
+
+class TelegramSender:
+    def __init__(
+        self,
+        bot: Bot,
+        concurrency: int,
+        global_rate: float,
+        chat_interval: float,
+        max_pending: int,
+    ) -> None:
+        self.bot = bot
+        self.concurrency = concurrency
+        self.chat_interval = chat_interval
+        self._bucket = TokenBucket(global_rate, global_rate)
+        self._slots = asyncio.Semaphore(max_pending)
+        self._chats: Dict[int, ChatState] = {}
+        self._ready: asyncio.Queue[int] = asyncio.Queue()
+        self._workers: list[asyncio.Task] = []
+        self.pending = 0
+        self.sent = 0
+        self.failed = 0
+        self.retry_after = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._workers = [loop.create_task(self._worker()) for _ in range(self.concurrency)]
+        self._workers.append(loop.create_task(self._purge_idle_chats()))
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def submit(self, chat_id: int, text: str) -> asyncio.Future:
+        await self._slots.acquire()
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(self._release)
+        state = self._chats.get(chat_id)
+        if state is None:
+            state = self._chats[chat_id] = ChatState()
+        state.items.append((text, future, monotonic()))
+        self.pending += 1
+        if not state.scheduled:
+            self._schedule(chat_id, state)
+        return future
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "chats": len(self._chats),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retry_after": self.retry_after,
+            "latency_avg_ms": round(self.latency_total / self.sent * 1000, 2) if self.sent else 0,
+            "latency_max_ms": round(self.latency_max * 1000, 2),
+        }
+
+    def _release(self, future: asyncio.Future) -> None:
+        self.pending -= 1
+        self._slots.release()
+
+    def _schedule(self, chat_id: int, state: ChatState) -> None:
+        # A chat is queued at most once, so a single worker owns it and keeps its order.
+        state.scheduled = True
+        delay = state.next_at - monotonic()
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._ready.put_nowait, chat_id)
+        else:
+            self._ready.put_nowait(chat_id)
+
+    async def _worker(self) -> None:
+        while True:
+            chat_id = await self._ready.get()
+            state = self._chats[chat_id]
+            text, future, queued_at = state.items[0]
+            await self._bucket.acquire()
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text, parse_mode="HTML")
+            except TelegramRetryAfter as e:
+                self.retry_after += 1
+                logger.warning(f"Chat {chat_id} paused for {e.retry_after}s")
+                state.next_at = monotonic() + e.retry_after
+                self._schedule(chat_id, state)
+                continue
+            except Exception as e:
+                self.failed += 1
+                state.items.popleft()
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                state.items.popleft()
+                latency = monotonic() - queued_at
+                self.sent += 1
+                self.latency_total += latency
+                self.latency_max = max(self.latency_max, latency)
+                if not future.done():
+                    future.set_result(None)
+            state.next_at = monotonic() + self.chat_interval
+            if state.items:
+                self._schedule(chat_id, state)
+            else:
+                state.scheduled = False
+
+    async def _purge_idle_chats(self) -> None:
+        while True:
+            await asyncio.sleep(60)
+            now = monotonic()
+            idle = [
+                chat_id
+                for chat_id, state in self._chats.items()
+                if not state.items and not state.scheduled and state.next_at < now
+            ]
+            for chat_id in idle:
+                del self._chats[chat_id]
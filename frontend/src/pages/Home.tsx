@@ -79,27 +79,37 @@ export default function Home() {
   useEffect(() => {
     const evtSource = new EventSource(`${import.meta.env.VITE_API_URL}/message-stream`, { withCredentials: true });
 
+    const applyEvent = (prev: any[], data: any): any[] => {
+      switch (data.event) {
+        case "message_created":
+          if (!prev.find((e) => e.id === data.id)) return [...prev, data];
+          return prev;
+        case "message_updated":
+          return prev.map((e) => {
+            if (e.id !== data.id) return e;
+            const cleanData = Object.fromEntries(Object.entries(data).filter(([_, v]) => v !== null && v !== undefined));
+            return { ...e, ...cleanData };
+          });
+        case "message_deleted":
+          return prev.filter((e) => e.id !== data.id);
+        case "messages_created":
+          return data.items.reduce((acc: any[], item: any) => applyEvent(acc, { ...item, event: "message_created" }), prev);
+        case "messages_updated":
+          return data.items.reduce((acc: any[], item: any) => applyEvent(acc, { ...item, event: "message_updated" }), prev);
+        case "messages_deleted": {
+          const ids = new Set(data.ids);
+          return prev.filter((e) => !ids.has(e.id));
+        }
+        default:
+          return prev;
+      }
+    };
+
     evtSource.onmessage = (event) => {
       const data = JSON.parse(event.data);
       setEvents((prev) => {
-        switch (data.event) {
-          case "message_created":
-            if (!prev.find((e) => e.id === data.id)) return sortEvents([...prev, data], sortBy);
-            return prev;
-          case "message_updated":
-            return sortEvents(
-              prev.map((e) => {
-                if (e.id !== data.id) return e;
-                const cleanData = Object.fromEntries(Object.entries(data).filter(([_, v]) => v !== null && v !== undefined));
-                return { ...e, ...cleanData };
-              }),
-              sortBy
-            );
-          case "message_deleted":
-            return prev.filter((e) => e.id !== data.id);
-          default:
-            return prev;
-        }
+        const next = applyEvent(prev, data);
+        return next === prev ? prev : sortEvents(next, sortBy);
       });
     };
 